@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 import json
 from arch import arch_model
 from concurrent.futures import ProcessPoolExecutor
+import heapq
+from itertools import repeat
 import logging
 
 # 设置图表输出路径
@@ -18,6 +20,8 @@ os.makedirs(tracks_dir, exist_ok=True)
 # 基础参数设置
 num_simulations = 10000  # 模拟路径数
 num_tracks_to_save = 10  # 保存的示例轨迹数
+chunk_size = 5000        # 每块写出的模拟条数
+random_seed = 42         # 随机种子
 simulation_days = 30     # 模拟天数
 base_rate = 1.0
 fee_per_trade = 0.001    # 每次交易手续费
@@ -240,10 +244,12 @@ def calculate_arbitrage_profit(currency_path, day, rates_dict, include_fees=True
 
 # 创建模拟类
 class ArbitrageSimulation:
-    def __init__(self, start_currency="USD", path_length=4, days=30):
+    def __init__(self, start_currency="USD", path_length=4, days=30, keep_details=True):
         self.start_currency = start_currency
         self.path_length = path_length
         self.days = days
+        # 为False时只保留计算摘要所需的即期汇率与每日收益，不计算远期汇率与CIP基差
+        self.keep_details = keep_details
         self.currency_path = generate_currency_path(start_currency, path_length)
         self.rates_dict = {}
         self.forward_rates_dict = {}
@@ -260,6 +266,10 @@ class ArbitrageSimulation:
             to_curr = self.currency_path[i+1]
             
             if (from_curr, to_curr) not in self.rates_dict and (to_curr, from_curr) not in self.rates_dict:
+                if not self.keep_details:
+                    self.rates_dict[(from_curr, to_curr)] = simulate_rate_path(from_curr, to_curr, self.days)
+                    continue
+                
                 # 模拟汇率路径
                 spot_rates, forward_rates = simulate_rate_path(from_curr, to_curr, self.days, include_forward=True)
                 self.rates_dict[(from_curr, to_curr)] = spot_rates
@@ -333,103 +343,263 @@ class ArbitrageSimulation:
         plt.savefig(save_path)
         plt.close()
 
-def run_simulations_in_parallel(num_simulations, simulation_days, currencies):
-    def run_single_simulation(sim_id):
+# 每次模拟输出的摘要列及其类型
+summary_columns = {
+    "sim_id": np.int64,
+    "currency_path": object,
+    "path_length": np.int64,
+    "is_triggered": np.bool_,
+    "trigger_day": np.int64,
+    "exit_day": np.int64,
+    "max_profit": np.float64,
+    "final_profit": np.float64,
+    "holding_period": np.int64
+}
+
+# 模拟一块连续编号的路径（在子进程中运行）
+def simulate_chunk(start_id, count, simulation_days, currencies, seed, num_tracks):
+    """
+    模拟编号为[start_id, start_id + count)的路径，摘要逐条写入预分配的列数组。
+    每条路径先抽取一个均匀随机键，只有键值位于当前最小的num_tracks个之内的路径
+    才保留完整明细（可跨块合并的蓄水池抽样），其余路径模拟后即丢弃。
+    
+    返回:
+    - columns: 摘要列字典，每列长度为count
+    - tracks: [(key, sim_id, sim), ...] 本块抽中的完整轨迹
+    """
+    np.random.seed(seed)
+    keys = np.random.default_rng(seed).random(count)
+    columns = {name: np.empty(count, dtype=dtype) for name, dtype in summary_columns.items()}
+    tracks = []  # (-key, sim_id, sim) 组成的最大堆，堆顶为当前保留的最大键
+    
+    for j in range(count):
+        sim_id = start_id + j
+        keep = len(tracks) < num_tracks or keys[j] < -tracks[0][0]
+        
         start_currency = np.random.choice(currencies)
         path_len = np.random.randint(3, min(len(currencies), 6))
-        sim = ArbitrageSimulation(start_currency, path_len, simulation_days)
+        sim = ArbitrageSimulation(start_currency, path_len, simulation_days, keep_details=keep)
         sim.simulate()
         sim_results = sim.get_results()
-        return {
-            "sim_id": sim_id,
-            "currency_path": "→".join(sim_results["currency_path"]),
-            "path_length": len(sim_results["currency_path"]) - 1,
-            "is_triggered": sim_results["is_triggered"],
-            "trigger_day": sim_results["trigger_day"] if sim_results["is_triggered"] else -1,
-            "exit_day": sim_results["exit_day"],
-            "max_profit": sim_results["max_profit"],
-            "final_profit": sim_results["final_profit"],
-            "holding_period": sim_results["exit_day"] - sim_results["trigger_day"] if sim_results["exit_day"] != -1 and sim_results["is_triggered"] else (simulation_days - sim_results["trigger_day"] if sim_results["is_triggered"] else 0)
-        }
-
+        
+        is_triggered = sim_results["is_triggered"]
+        trigger_day = sim_results["trigger_day"] if is_triggered else -1
+        exit_day = sim_results["exit_day"]
+        if not is_triggered:
+            holding_period = 0
+        elif exit_day != -1:
+            holding_period = exit_day - trigger_day
+        else:
+            holding_period = simulation_days - trigger_day
+        
+        columns["sim_id"][j] = sim_id
+        columns["currency_path"][j] = "→".join(sim_results["currency_path"])
+        columns["path_length"][j] = len(sim_results["currency_path"]) - 1
+        columns["is_triggered"][j] = is_triggered
+        columns["trigger_day"][j] = trigger_day
+        columns["exit_day"][j] = exit_day
+        columns["max_profit"][j] = sim_results["max_profit"]
+        columns["final_profit"][j] = sim_results["final_profit"]
+        columns["holding_period"][j] = holding_period
+        
+        if keep:
+            item = (-keys[j], sim_id, sim)
+            if len(tracks) < num_tracks:
+                heapq.heappush(tracks, item)
+            else:
+                heapq.heapreplace(tracks, item)
+    
+    return columns, [(-neg_key, sim_id, sim) for neg_key, sim_id, sim in tracks]
+
+# 摘要列的分块写出器
+class SummarySink:
+    """
+    逐块写出模拟摘要：安装了pyarrow时写Parquet，否则追加写CSV。
+    同时在线累计日志和图表需要的统计量，内存占用与模拟总数无关。
+    """
+    
+    def __init__(self, base_path, days, sample_size=100000, seed=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            pa = pq = None
+        self._pa = pa
+        self._pq = pq
+        self._writer = None
+        self.path = base_path + (".parquet" if pq is not None else ".csv")
+        self.days = days
+        
+        # 在线统计量
+        self.num_simulations = 0
+        self.num_triggered = 0
+        self.holding_period_sum = 0
+        self.triggered_max_profit_sum = 0.0
+        self.path_length_counts = np.zeros(0, dtype=np.int64)
+        self.holding_period_hist = np.zeros(days + 1, dtype=np.int64)
+        
+        # max_profit的均匀抽样，仅用于绘制分布直方图
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+        self._sample_keys = np.empty(0)
+        self.max_profit_sample = np.empty(0)
+    
+    def write(self, columns):
+        n = len(columns["sim_id"])
+        if n == 0:
+            return
+        
+        if self._pq is not None:
+            table = self._pa.table({name: columns[name] for name in summary_columns})
+            if self._writer is None:
+                self._writer = self._pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            first = self.num_simulations == 0
+            pd.DataFrame(columns, columns=list(summary_columns)).to_csv(
+                self.path, mode="w" if first else "a", header=first, index=False
+            )
+        
+        triggered = columns["is_triggered"]
+        self.num_simulations += n
+        self.num_triggered += int(triggered.sum())
+        self.holding_period_sum += int(columns["holding_period"][triggered].sum())
+        self.triggered_max_profit_sum += float(columns["max_profit"][triggered].sum())
+        
+        counts = np.bincount(columns["path_length"], minlength=self.path_length_counts.size)
+        counts[:self.path_length_counts.size] += self.path_length_counts
+        self.path_length_counts = counts
+        self.holding_period_hist += np.bincount(
+            columns["holding_period"][triggered], minlength=self.days + 1
+        )[:self.days + 1]
+        
+        # 保留随机键最小的sample_size个值
+        keys = np.concatenate([self._sample_keys, self._rng.random(n)])
+        values = np.concatenate([self.max_profit_sample, columns["max_profit"]])
+        if keys.size > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, values = keys[keep], values[keep]
+        self._sample_keys = keys
+        self.max_profit_sample = values
+    
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+    
+    @property
+    def trigger_rate(self):
+        return self.num_triggered / self.num_simulations if self.num_simulations else float("nan")
+    
+    @property
+    def avg_holding_period(self):
+        return self.holding_period_sum / self.num_triggered if self.num_triggered else float("nan")
+    
+    @property
+    def avg_max_profit(self):
+        return self.triggered_max_profit_sum / self.num_triggered if self.num_triggered else float("nan")
+
+def run_simulations_in_parallel(num_simulations, simulation_days, currencies, sink,
+                                num_tracks=num_tracks_to_save, chunk_size=chunk_size, seed=random_seed):
+    """
+    分块并行运行模拟，每块的摘要列交给sink写出，只保留抽样轨迹的完整明细
+    
+    返回:
+    - track_sims: 抽中的完整轨迹，按sim_id排序
+    """
+    starts = list(range(0, num_simulations, chunk_size))
+    counts = [min(chunk_size, num_simulations - start) for start in starts]
+    seeds = np.random.SeedSequence(seed).generate_state(len(starts))
+    tracks = []
+    
     with ProcessPoolExecutor() as executor:
-        results = list(executor.map(run_single_simulation, range(num_simulations)))
-
-    return results
-
-# 运行多条模拟
-print("开始模拟多角套汇和远期货币交换...")
-logging.basicConfig(
-    filename=os.path.join(current_dir, "simulation.log"),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-logging.info("开始模拟多角套汇和远期货币交换...")
-logging.info(f"模拟参数: num_simulations={num_simulations}, simulation_days={simulation_days}, currencies={currencies}")
-
-results = run_simulations_in_parallel(num_simulations, simulation_days, currencies)
-
-# 创建数据框并保存CSV
-df = pd.DataFrame(results)
-csv_path = os.path.join(os.path.dirname(current_dir), "pricingresult.csv")  # 保存到根目录
-df.to_csv(csv_path, index=False)
-
-# 分析并绘制触发率图表
-trigger_rate = df["is_triggered"].mean()
-avg_holding_period = df[df["is_triggered"]]["holding_period"].mean()
-avg_max_profit = df[df["is_triggered"]]["max_profit"].mean()
-
-plt.figure(figsize=(12, 8))
-plt.subplot(2, 2, 1)
-df["path_length"].value_counts().sort_index().plot(kind='bar')
-plt.title('Path Length Distribution')
-plt.xlabel('Number of Currency Pairs')
-plt.ylabel('Count')
-
-plt.subplot(2, 2, 2)
-plt.hist(df["max_profit"], bins=50, alpha=0.7, color='skyblue')
-plt.axvline(knock_in_threshold, color='r', linestyle='--')
-plt.title(f'Max Profit Distribution\nKnock-in Threshold: {knock_in_threshold}')
-plt.xlabel('Max Profit Rate')
-plt.ylabel('Frequency')
-
-plt.subplot(2, 2, 3)
-triggered_df = df[df["is_triggered"]]
-if not triggered_df.empty:
-    plt.hist(triggered_df["holding_period"], bins=30, alpha=0.7, color='lightgreen')
-    plt.title(f'Holding Period Distribution\nAvg: {avg_holding_period:.2f} days')
-    plt.xlabel('Days')
+        chunk_results = executor.map(
+            simulate_chunk, starts, counts, repeat(simulation_days),
+            repeat(currencies), seeds, repeat(num_tracks)
+        )
+        for columns, chunk_tracks in chunk_results:
+            sink.write(columns)
+            tracks = heapq.nsmallest(num_tracks, tracks + chunk_tracks, key=lambda item: item[0])
+    
+    return [sim for _, _, sim in sorted(tracks, key=lambda item: item[1])]
+
+def main():
+    # 运行多条模拟
+    print("开始模拟多角套汇和远期货币交换...")
+    logging.basicConfig(
+        filename=os.path.join(current_dir, "simulation.log"),
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    logging.info("开始模拟多角套汇和远期货币交换...")
+    logging.info(f"模拟参数: num_simulations={num_simulations}, simulation_days={simulation_days}, currencies={currencies}")
+    
+    # 摘要逐块写出，保存到根目录
+    sink = SummarySink(os.path.join(os.path.dirname(current_dir), "pricingresult"), simulation_days, seed=random_seed)
+    try:
+        track_sims = run_simulations_in_parallel(num_simulations, simulation_days, currencies, sink)
+    finally:
+        sink.close()
+    
+    # 分析并绘制触发率图表
+    trigger_rate = sink.trigger_rate
+    avg_holding_period = sink.avg_holding_period
+    avg_max_profit = sink.avg_max_profit
+    
+    plt.figure(figsize=(12, 8))
+    plt.subplot(2, 2, 1)
+    path_lengths = np.flatnonzero(sink.path_length_counts)
+    plt.bar(path_lengths.astype(str), sink.path_length_counts[path_lengths])
+    plt.title('Path Length Distribution')
+    plt.xlabel('Number of Currency Pairs')
+    plt.ylabel('Count')
+    
+    plt.subplot(2, 2, 2)
+    plt.hist(sink.max_profit_sample, bins=50, alpha=0.7, color='skyblue')
+    plt.axvline(knock_in_threshold, color='r', linestyle='--')
+    plt.title(f'Max Profit Distribution\nKnock-in Threshold: {knock_in_threshold}')
+    plt.xlabel('Max Profit Rate')
     plt.ylabel('Frequency')
-else:
-    plt.text(0.5, 0.5, 'No triggered scenarios', horizontalalignment='center', verticalalignment='center')
-
-plt.subplot(2, 2, 4)
-labels = ['Triggered', 'Not Triggered']
-sizes = [trigger_rate, 1 - trigger_rate]
-plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=['lightgreen', 'lightcoral'])
-plt.title(f'Trigger Rate: {trigger_rate:.2%}')
-
-plt.tight_layout()
-plt.savefig(os.path.join(simulation_charts_dir, "payoff_distribution.png"))
-plt.close()
-
-# 保存示例轨迹图
-for i, sim in enumerate(track_sims):
-    if i < num_tracks_to_save:
+    
+    plt.subplot(2, 2, 3)
+    if sink.num_triggered > 0:
+        plt.hist(np.arange(sink.holding_period_hist.size), bins=30, weights=sink.holding_period_hist,
+                 alpha=0.7, color='lightgreen')
+        plt.title(f'Holding Period Distribution\nAvg: {avg_holding_period:.2f} days')
+        plt.xlabel('Days')
+        plt.ylabel('Frequency')
+    else:
+        plt.text(0.5, 0.5, 'No triggered scenarios', horizontalalignment='center', verticalalignment='center')
+    
+    plt.subplot(2, 2, 4)
+    labels = ['Triggered', 'Not Triggered']
+    sizes = [trigger_rate, 1 - trigger_rate]
+    plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=['lightgreen', 'lightcoral'])
+    plt.title(f'Trigger Rate: {trigger_rate:.2%}')
+    
+    plt.tight_layout()
+    plt.savefig(os.path.join(simulation_charts_dir, "payoff_distribution.png"))
+    plt.close()
+    
+    # 保存示例轨迹图
+    for i, sim in enumerate(track_sims):
         sim.plot_profit_path(os.path.join(tracks_dir, f"track_{i}.png"))
-
-logging.info("模拟完成！")
-logging.info(f"总共模拟了 {num_simulations} 条路径")
-logging.info(f"触发率: {trigger_rate:.2%}")
-logging.info(f"平均持有期: {avg_holding_period:.2f} 天")
-logging.info(f"平均最大收益: {avg_max_profit:.4f}")
-logging.info(f"CSV保存到: {csv_path}")
-logging.info(f"图表保存到: {simulation_charts_dir}")
-
-print(f"模拟完成！")
-print(f"总共模拟了 {num_simulations} 条路径")
-print(f"触发率: {trigger_rate:.2%}")
-print(f"平均持有期: {avg_holding_period:.2f} 天")
-print(f"平均最大收益: {avg_max_profit:.4f}")
-print(f"CSV保存到: {csv_path}")
-print(f"图表保存到: {simulation_charts_dir}")
+    
+    logging.info("模拟完成！")
+    logging.info(f"总共模拟了 {sink.num_simulations} 条路径")
+    logging.info(f"触发率: {trigger_rate:.2%}")
+    logging.info(f"平均持有期: {avg_holding_period:.2f} 天")
+    logging.info(f"平均最大收益: {avg_max_profit:.4f}")
+    logging.info(f"结果保存到: {sink.path}")
+    logging.info(f"图表保存到: {simulation_charts_dir}")
+    
+    print(f"模拟完成！")
+    print(f"总共模拟了 {sink.num_simulations} 条路径")
+    print(f"触发率: {trigger_rate:.2%}")
+    print(f"平均持有期: {avg_holding_period:.2f} 天")
+    print(f"平均最大收益: {avg_max_profit:.4f}")
+    print(f"结果保存到: {sink.path}")
+    print(f"图表保存到: {simulation_charts_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# tick_replay.py
+# Day004 — 多角套汇的事件驱动逐笔回放（考虑每条腿的执行延迟）
+
+import numpy as np
+import os
+import tempfile
+import time
+from itertools import permutations
+
+from pricing_model import (
+    currencies, fee_per_trade, knock_in_threshold, knock_out_threshold,
+    get_rate, get_volatility
+)
+
+# 报价文件的二进制记录格式：纳秒时间戳、基础货币、报价货币、汇率（1单位base兑换的quote数量）
+QUOTE_DTYPE = np.dtype([("ts", "<i8"), ("base", "u1"), ("quote", "u1"), ("rate", "<f8")])
+
+# 外汇按全年24小时、252个交易日计的纳秒数，用于把年化波动率换算到逐笔时间尺度
+NS_PER_YEAR = 252 * 24 * 3600 * 10**9
+
+# 由各货币的美元报价推出的无套利交叉汇率（对数，规范方向i < j）
+def cross_log_rates():
+    usd_log = np.log([get_rate("USD", c) for c in currencies])
+    base, quote = np.triu_indices(len(currencies), k=1)
+    return usd_log[quote] - usd_log[base]
+
+# 读取内存映射的报价文件
+def load_quotes(path):
+    return np.memmap(path, dtype=QUOTE_DTYPE, mode="r")
+
+# 生成本地模拟报价文件（代替真实行情源）
+def generate_quote_file(path, num_quotes, mean_interval_ns=5000, quote_noise=0.0008,
+                        block_size=1 << 16, seed=None):
+    """
+    生成按时间排序的模拟逐笔报价并写入二进制文件
+
+    参数:
+    - path: 输出文件路径
+    - num_quotes: 报价笔数
+    - mean_interval_ns: 平均报价间隔（纳秒，指数分布）
+    - quote_noise: 每笔报价相对有效价格的对数噪声标准差，使交叉汇率出现短暂的套利偏离
+    - block_size: 分块生成的大小，内存占用与num_quotes无关
+    - seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    n = len(currencies)
+    pair_base, pair_quote = np.triu_indices(n, k=1)
+    pair_vol = np.array([get_volatility(currencies[i], currencies[j]) for i, j in zip(pair_base, pair_quote)])
+    # 各货币对的有效对数价格（随机游走），按块携带
+    level = cross_log_rates()
+    last_ts = 0
+
+    with open(path, "wb") as f:
+        for start in range(0, num_quotes, block_size):
+            count = min(block_size, num_quotes - start)
+            ts = last_ts + np.cumsum(rng.exponential(mean_interval_ns, count)).astype(np.int64)
+            last_ts = int(ts[-1])
+            p = rng.integers(0, len(pair_base), count)
+
+            # 只有被报价的货币对在该笔上游走一步
+            step_std = pair_vol[p] * np.sqrt(mean_interval_ns * len(pair_base) / NS_PER_YEAR)
+            walk = np.zeros((count, len(pair_base)))
+            walk[np.arange(count), p] = step_std * rng.standard_normal(count)
+            walk = np.cumsum(walk, axis=0) + level
+            log_rate = walk[np.arange(count), p] + quote_noise * rng.standard_normal(count)
+            level = walk[-1]
+
+            # 一半报价以反向货币对给出
+            flip = rng.random(count) < 0.5
+            block = np.empty(count, dtype=QUOTE_DTYPE)
+            block["ts"] = ts
+            block["base"] = np.where(flip, pair_quote[p], pair_base[p])
+            block["quote"] = np.where(flip, pair_base[p], pair_quote[p])
+            block["rate"] = np.exp(np.where(flip, -log_rate, log_rate))
+            block.tofile(f)
+
+# 枚举所有有向套汇环
+def enumerate_cycles(n, min_legs=3, max_legs=None):
+    """
+    枚举n种货币上长度为[min_legs, max_legs]的有向简单环，
+    每个环只保留以最小编号货币开头的一种旋转，两个方向视为不同的套汇路径
+    """
+    max_legs = n if max_legs is None else max_legs
+    cycles = []
+    for legs in range(min_legs, max_legs + 1):
+        for path in permutations(range(n), legs):
+            if path[0] == min(path):
+                cycles.append(path)
+    return cycles
+
+class TickArbitrageReplay:
+    """
+    逐笔报价的事件驱动套汇回放器
+
+    - 最新汇率矩阵rate_matrix原地更新
+    - 每笔报价只增量更新经过该货币对的套汇环（货币对→环的CSR索引）
+    - 套汇环收益上穿敲入阈值时下单，敲出阈值以下重新武装
+    - 各腿依次执行，每条腿在前一条成交后经过leg_latency_ns才以当时的最新汇率成交；
+      在途的腿以列数组保存，按轮向量化推进，每轮每个订单至多成交一条腿
+    - leg_latency_ns为标量时所有腿共用；为序列时长度必须覆盖最长的环，不足则报错
+    """
+
+    def __init__(self, leg_latency_ns=50_000, min_legs=3, max_legs=None,
+                 knock_in=knock_in_threshold, knock_out=knock_out_threshold, fee=fee_per_trade):
+        n = len(currencies)
+        self.cycles = enumerate_cycles(n, min_legs, max_legs)
+        self.cycle_labels = ["→".join(currencies[i] for i in c + (c[0],)) for c in self.cycles]
+        self.fee = fee
+        self.log_knock_in = np.log1p(knock_in)
+        self.log_knock_out = np.log1p(knock_out)
+
+        # 无序货币对编号及其规范方向(i < j)
+        self._pair_base, self._pair_quote = np.triu_indices(n, k=1)
+        self.pair_index = np.zeros((n, n), dtype=np.intp)
+        self.pair_index[self._pair_base, self._pair_quote] = np.arange(len(self._pair_base))
+        self.pair_index[self._pair_quote, self._pair_base] = np.arange(len(self._pair_base))
+
+        # 有符号关联矩阵：incidence[p, c]为环c中货币对p的方向（+1/-1/0）
+        self.cycle_legs = []
+        self.incidence = np.zeros((len(self._pair_base), len(self.cycles)))
+        for c, cycle in enumerate(self.cycles):
+            legs = []
+            for a, b in zip(cycle, cycle[1:] + cycle[:1]):
+                sign = 1.0 if a < b else -1.0
+                legs.append((self.pair_index[a, b], sign))
+                self.incidence[self.pair_index[a, b], c] = sign
+            self.cycle_legs.append(legs)
+        num_legs = np.array([len(c) for c in self.cycles])
+        self._fee_log = num_legs * np.log1p(-fee)
+
+        # 货币对→环的CSR索引：第p个货币对经过的环为indices[indptr[p]:indptr[p + 1]]
+        pair_rows, pair_cycles = np.nonzero(self.incidence)
+        self._pair_cycle_indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(pair_rows, minlength=len(self._pair_base)))])
+        # 环编号用能容纳的最小整数类型存放，分段用的稳定排序可走基数排序
+        self._pair_cycle_indices = pair_cycles.astype(np.min_scalar_type(len(self.cycles)))
+        self._pair_cycle_sign = self.incidence[pair_rows, pair_cycles]
+
+        # 各环的腿按列存放（不足最长环的部分补零），供向量化成交使用
+        self._num_legs = num_legs
+        self._leg_pair = np.zeros((len(self.cycles), num_legs.max()), dtype=np.intp)
+        self._leg_sign = np.zeros((len(self.cycles), num_legs.max()))
+        for c, legs in enumerate(self.cycle_legs):
+            self._leg_pair[c, :len(legs)] = [p for p, _ in legs]
+            self._leg_sign[c, :len(legs)] = [sign for _, sign in legs]
+
+        latency = np.atleast_1d(np.asarray(leg_latency_ns, dtype=np.int64))
+        if latency.size == 1:
+            latency = np.full(num_legs.max(), latency[0])
+        elif latency.size < num_legs.max():
+            raise ValueError(f"leg_latency_ns 长度为 {latency.size}，少于最长套汇环的腿数 {num_legs.max()}")
+        self.leg_latency_ns = latency
+
+        self.reset()
+
+    def reset(self):
+        """恢复到初始汇率，清空在途订单与成交记录"""
+        n = len(currencies)
+        self.pair_log_rate = cross_log_rates()
+        self.rate_matrix = np.ones((n, n))
+        self._sync_rate_matrix()
+        self.cycle_log_profit = self.pair_log_rate @ self.incidence + self._fee_log
+        self.knocked_in = self.cycle_log_profit > self.log_knock_in
+        self.num_quotes = 0
+        self._num_orders = 0
+        self._orders = {"cycle": [np.empty(0, dtype=np.intp)], "signal_ts": [np.empty(0, dtype=np.int64)],
+                        "signal_profit": [np.empty(0)]}
+        self._filled = {"order": [np.empty(0, dtype=np.intp)], "fill_ts": [np.empty(0, dtype=np.int64)],
+                        "factor": [np.empty(0)]}
+        self._pending = {"order": np.empty(0, dtype=np.intp), "cycle": np.empty(0, dtype=np.intp),
+                         "leg": np.empty(0, dtype=np.intp), "exec_ts": np.empty(0, dtype=np.int64),
+                         "factor": np.empty(0)}
+
+    def _sync_rate_matrix(self):
+        rates = np.exp(self.pair_log_rate)
+        self.rate_matrix[self._pair_base, self._pair_quote] = rates
+        self.rate_matrix[self._pair_quote, self._pair_base] = 1.0 / rates
+
+    def _drain(self, until_ts, ts, pair_state, carry_state):
+        """执行所有不晚于until_ts的在途腿，成交价取该时刻之前最后一笔报价后的状态"""
+        pending = self._pending
+        while True:
+            due = pending["exec_ts"] <= until_ts
+            if not due.any():
+                break
+            legs = {key: value[due] for key, value in pending.items()}
+            rest = {key: value[~due] for key, value in pending.items()}
+
+            j = np.searchsorted(ts, legs["exec_ts"], side="right") - 1
+            state = np.where((j >= 0)[:, None], pair_state[np.maximum(j, 0)], carry_state)
+            p = self._leg_pair[legs["cycle"], legs["leg"]]
+            sign = self._leg_sign[legs["cycle"], legs["leg"]]
+            factor = legs["factor"] * (np.exp(sign * state[np.arange(len(p)), p]) * (1 - self.fee))
+
+            # 最后一条腿成交即完成，其余订单按下一条腿的延迟重新排入
+            next_leg = legs["leg"] + 1
+            done = next_leg >= self._num_legs[legs["cycle"]]
+            self._filled["order"].append(legs["order"][done])
+            self._filled["fill_ts"].append(legs["exec_ts"][done])
+            self._filled["factor"].append(factor[done])
+
+            live = ~done
+            scheduled = {
+                "order": legs["order"][live],
+                "cycle": legs["cycle"][live],
+                "leg": next_leg[live],
+                "exec_ts": legs["exec_ts"][live] + self.leg_latency_ns[next_leg[live]],
+                "factor": factor[live]
+            }
+            pending = {key: np.concatenate([rest[key], scheduled[key]]) for key in pending}
+        self._pending = pending
+
+    def process_block(self, quotes):
+        """处理一块按时间排序的报价"""
+        count = len(quotes)
+        if count == 0:
+            return
+        ts = np.asarray(quotes["ts"])
+        base = quotes["base"].astype(np.intp)
+        quote = quotes["quote"].astype(np.intp)
+        p = self.pair_index[base, quote]
+        log_rate = np.log(quotes["rate"])
+        log_rate = np.where(base < quote, log_rate, -log_rate)
+        rows = np.arange(count)
+
+        # 每笔报价后各货币对的最新对数汇率（向前填充），第-1行为块前状态
+        last = np.full((count, len(self.pair_log_rate)), -1, dtype=np.intp)
+        last[rows, p] = rows
+        np.maximum.accumulate(last, axis=0, out=last)
+        pair_state = np.where(last >= 0, log_rate[np.maximum(last, 0)], self.pair_log_rate)
+        prev_state = np.vstack([self.pair_log_rate, pair_state[:-1]])
+        delta = log_rate - prev_state[rows, p]
+
+        # 增量更新：按CSR索引把每笔报价展开到经过该货币对的环上，得到(报价, 环)事件
+        start = self._pair_cycle_indptr[p]
+        counts = self._pair_cycle_indptr[p + 1] - start
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        slot = np.repeat(start, counts) + offsets
+        event_row = np.repeat(rows, counts)
+        event_cycle = self._pair_cycle_indices[slot]
+        event_delta = np.repeat(delta, counts) * self._pair_cycle_sign[slot]
+
+        # 按环分段（段内保持时间顺序）：稳定排序后同一环的事件连续排列，段长即该环的事件数
+        order = np.argsort(event_cycle, kind="stable")
+        event_row, event_delta = event_row[order], event_delta[order]
+        segment_length = np.bincount(event_cycle, minlength=len(self.cycles))
+        segment_first = np.cumsum(segment_length) - segment_length
+        active = np.flatnonzero(segment_length)
+        event_cycle = np.repeat(np.arange(len(self.cycles)), segment_length)
+        first = np.repeat(segment_first, segment_length)
+
+        # 段内累加得到每个事件后的环收益
+        running = np.cumsum(event_delta)
+        offset = np.zeros(len(self.cycles))
+        offset[active] = running[segment_first[active]] - event_delta[segment_first[active]]
+        cycle_profit = running - np.repeat(offset, segment_length) + np.repeat(self.cycle_log_profit, segment_length)
+
+        # 敲入/敲出迟滞状态：取段内最近一次越过任一阈值的方向，段内未越过则沿用块前状态；
+        # 越过的位置与方向编码为 2·位置+方向，一次累积最大值同时得到两者
+        above = cycle_profit > self.log_knock_in
+        decisive = above | (cycle_profit < self.log_knock_out)
+        last_cross = np.maximum.accumulate(np.where(decisive, 2 * np.arange(len(event_cycle)) + above, -1))
+        knocked_in = np.where(last_cross >= 2 * first, (last_cross & 1).astype(bool),
+                              np.repeat(self.knocked_in, segment_length))
+        prev_knocked_in = np.empty_like(knocked_in)
+        prev_knocked_in[1:] = knocked_in[:-1]
+        prev_knocked_in[segment_first[active]] = self.knocked_in[active]
+        signals = np.flatnonzero(knocked_in & ~prev_knocked_in)
+
+        # 新信号按(报价时间, 环编号)排序后整批下单，第一条腿直接进入在途数组
+        if len(signals) > 0:
+            signals = signals[np.lexsort((event_cycle[signals], event_row[signals]))]
+            signal_ts = ts[event_row[signals]]
+            self._orders["cycle"].append(event_cycle[signals])
+            self._orders["signal_ts"].append(signal_ts)
+            self._orders["signal_profit"].append(np.expm1(cycle_profit[signals]))
+            order_ids = np.arange(self._num_orders, self._num_orders + len(signals))
+            self._num_orders += len(signals)
+            scheduled = {
+                "order": order_ids,
+                "cycle": event_cycle[signals],
+                "leg": np.zeros(len(signals), dtype=np.intp),
+                "exec_ts": signal_ts + self.leg_latency_ns[0],
+                "factor": np.ones(len(signals))
+            }
+            self._pending = {key: np.concatenate([self._pending[key], scheduled[key]]) for key in scheduled}
+        self._drain(ts[-1], ts, pair_state, self.pair_log_rate)
+
+        self.pair_log_rate = pair_state[-1].copy()
+        segment_last = segment_first[active] + segment_length[active] - 1
+        self.cycle_log_profit = self.cycle_log_profit.copy()
+        self.cycle_log_profit[active] = cycle_profit[segment_last]
+        self.knocked_in = self.knocked_in.copy()
+        self.knocked_in[active] = knocked_in[segment_last]
+        self._sync_rate_matrix()
+        self.num_quotes += count
+
+    def finish(self):
+        """行情结束：剩余在途的腿以最后的汇率成交"""
+        state = self.pair_log_rate[None, :]
+        self._drain(np.iinfo(np.int64).max, np.full(1, np.iinfo(np.int64).min), state, self.pair_log_rate)
+
+    def run(self, path, block_size=1 << 14):
+        """
+        回放报价文件
+
+        返回:
+        - results: 列式成交结果，包含环编号、信号时间、完成时间、信号收益与实际收益
+        """
+        quotes = load_quotes(path)
+        for start in range(0, len(quotes), block_size):
+            self.process_block(quotes[start:start + block_size])
+        self.finish()
+        return self.results()
+
+    def results(self):
+        orders = self._orders
+        filled_order = np.concatenate(self._filled["order"])
+        # 未完成的订单完成时间记为-1，实际收益为已成交腿的累计结果
+        fill_ts = np.full(self._num_orders, -1, dtype=np.int64)
+        factor = np.ones(self._num_orders)
+        fill_ts[filled_order] = np.concatenate(self._filled["fill_ts"])
+        factor[filled_order] = np.concatenate(self._filled["factor"])
+        factor[self._pending["order"]] = self._pending["factor"]
+        return {
+            "cycle": np.concatenate(orders["cycle"]).astype(np.intp),
+            "signal_ts": np.concatenate(orders["signal_ts"]).astype(np.int64),
+            "fill_ts": fill_ts,
+            "signal_profit": np.concatenate(orders["signal_profit"]),
+            "realized_profit": factor - 1.0
+        }
+
+def main():
+    num_quotes = 10_000_000
+    quote_path = os.path.join(tempfile.gettempdir(), "day004_fx_quotes.bin")
+
+    print(f"生成 {num_quotes} 笔模拟报价: {quote_path}")
+    generate_quote_file(quote_path, num_quotes, seed=42)
+
+    replay = TickArbitrageReplay(leg_latency_ns=[50_000, 80_000, 80_000, 120_000, 120_000])
+    start = time.perf_counter()
+    results = replay.run(quote_path)
+    elapsed = time.perf_counter() - start
+
+    print(f"回放 {replay.num_quotes} 笔报价，用时 {elapsed:.2f} 秒 "
+          f"({replay.num_quotes / elapsed * 60 / 1e6:.1f} 百万笔/分钟)")
+    print(f"监控套汇环数量: {len(replay.cycles)}")
+    print(f"触发次数: {len(results['cycle'])}")
+    if len(results["cycle"]) > 0:
+        slippage = results["realized_profit"] - results["signal_profit"]
+        print(f"平均信号收益: {results['signal_profit'].mean():.6f}")
+        print(f"平均实际收益: {results['realized_profit'].mean():.6f}")
+        print(f"平均延迟滑点: {slippage.mean():.6f}")
+        print(f"实际盈利比例: {(results['realized_profit'] > 0).mean():.2%}")
+    print("最新汇率矩阵:")
+    print(np.array2string(replay.rate_matrix, precision=6))
+
+if __name__ == "__main__":
+    main()
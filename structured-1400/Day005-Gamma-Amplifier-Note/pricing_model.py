@@ -79,21 +79,50 @@ class GammaAmplifierNote:
         if random_seed is not None:
             np.random.seed(random_seed)
         
-        # 初始化价格矩阵
-        price_paths = np.zeros((num_paths, self.total_steps + 1))
-        price_paths[:, 0] = self.S0
+        # 一次生成全部标准正态增量，按行（路径）顺序与逐点生成一致
+        z = np.random.normal(0, 1, (num_paths, self.total_steps))
+        log_increments = (self.r - 0.5 * self.sigma**2) * self.dt + self.sigma * np.sqrt(self.dt) * z
         
-        # 生成随机价格路径
-        for i in range(num_paths):
-            for t in range(1, self.total_steps + 1):
-                z = np.random.normal(0, 1)
-                price_paths[i, t] = price_paths[i, t-1] * np.exp(
-                    (self.r - 0.5 * self.sigma**2) * self.dt + 
-                    self.sigma * np.sqrt(self.dt) * z
-                )
+        # 对数收益累加后取指数得到价格路径
+        price_paths = np.empty((num_paths, self.total_steps + 1))
+        price_paths[:, 0] = self.S0
+        price_paths[:, 1:] = self.S0 * np.exp(np.cumsum(log_increments, axis=1))
         
         return price_paths
     
+    def iterate_path_chunks(self, num_paths, time_chunk=256, random_seed=None):
+        """
+        按时间分块生成价格路径，只保留当前时间块，不保存完整路径矩阵
+        
+        参数:
+            num_paths (int): 模拟路径数量
+            time_chunk (int): 每个时间块的步数
+            random_seed (int): 随机数种子，用于复现结果
+            
+        生成:
+            tuple: (times, prev_prices, prices, z)
+                times为本块各步的时刻，形状(c,)；
+                prev_prices、prices、z分别为上一步价格、当前价格和标准正态增量，形状(num_paths, c)
+        """
+        if random_seed is not None:
+            np.random.seed(random_seed)
+        
+        drift = (self.r - 0.5 * self.sigma**2) * self.dt
+        diffusion = self.sigma * np.sqrt(self.dt)
+        last_prices = np.full(num_paths, float(self.S0))
+        
+        for start in range(1, self.total_steps + 1, time_chunk):
+            stop = min(start + time_chunk, self.total_steps + 1)
+            z = np.random.normal(0, 1, (num_paths, stop - start))
+            prices = last_prices[:, None] * np.exp(np.cumsum(drift + diffusion * z, axis=1))
+            
+            prev_prices = np.empty_like(prices)
+            prev_prices[:, 0] = last_prices
+            prev_prices[:, 1:] = prices[:, :-1]
+            last_prices = prices[:, -1]
+            
+            yield np.arange(start, stop) * self.dt, prev_prices, prices, z
+    
     def is_activated(self, price):
         """
         判断价格是否在激活区间内
@@ -106,20 +135,23 @@ class GammaAmplifierNote:
         """
         return self.activation_low <= price <= self.activation_high
     
-    def calculate_gamma(self, S, t):
+    def calculate_gamma(self, S, t, K=None):
         """
         计算在价格S和时间t下的Gamma值
         
         参数:
             S (float): 当前价格
             t (float): 当前时间（距离到期的时间）
+            K (float): 期权行权价，默认为激活中心点self.K
             
         返回:
             float: Gamma值
         """
+        K = self.K if K is None else K
+        
         # 计算ATM期权的Gamma
-        tau = max(self.T - t, 1e-10)  # 避免除以0
-        d1 = (np.log(S / self.K) + (self.r + 0.5 * self.sigma**2) * tau) / (self.sigma * np.sqrt(tau))
+        tau = np.maximum(self.T - t, 1e-10)  # 避免除以0，同时支持数组输入
+        d1 = (np.log(S / K) + (self.r + 0.5 * self.sigma**2) * tau) / (self.sigma * np.sqrt(tau))
         gamma = np.exp(-d1**2 / 2) / (S * self.sigma * np.sqrt(2 * np.pi * tau))
         return gamma
     
@@ -169,50 +201,262 @@ class GammaAmplifierNote:
         
         return payoff
     
-    def calculate_vanilla_straddle_payoff(self, price_path):
+    def calculate_gamma_contributions(self, prev_prices, prices, times):
         """
-        计算普通跨式组合(Long Straddle)在给定价格路径下的收益
+        向量化计算一段时间内每一步的Gamma贡献，激活区间外的贡献为0
         
         参数:
-            price_path (numpy.ndarray): 单条价格路径
+            prev_prices (numpy.ndarray): 上一步价格，形状(num_paths, c)
+            prices (numpy.ndarray): 当前价格，形状(num_paths, c)
+            times (numpy.ndarray): 当前时刻，形状(c,)
+            
+        返回:
+            tuple: (in_band, contributions)，分别为是否在激活区间的布尔矩阵和对应的Gamma贡献
+        """
+        in_band = (prices >= self.activation_low) & (prices <= self.activation_high)
+        contributions = np.zeros(prices.shape)
+        
+        # 只在激活区间内的点上计算Gamma
+        rows, cols = np.nonzero(in_band)
+        current_price = prices[rows, cols]
+        previous_price = prev_prices[rows, cols]
+        price_change = (current_price - previous_price) / previous_price
+        gamma = self.calculate_gamma(current_price, times[cols])
+        contributions[rows, cols] = gamma * self.amplification_factor * price_change**2
+        
+        return in_band, contributions
+    
+    def calculate_gan_payoffs(self, price_paths, time_chunk=256):
+        """
+        批量计算多条价格路径下的GAN收益，结果与逐条调用calculate_gan_payoff一致
+        
+        参数:
+            price_paths (numpy.ndarray): 价格路径矩阵，形状为(num_paths, total_steps+1)
+            time_chunk (int): 每个时间块的步数，用于控制临时数组大小
+            
+        返回:
+            numpy.ndarray: 每条路径的GAN收益率
+        """
+        num_steps = price_paths.shape[1]
+        gamma_contribution = np.zeros(price_paths.shape[0])
+        
+        for start in range(1, num_steps, time_chunk):
+            stop = min(start + time_chunk, num_steps)
+            _, contributions = self.calculate_gamma_contributions(
+                price_paths[:, start - 1:stop - 1], price_paths[:, start:stop], np.arange(start, stop) * self.dt
+            )
+            gamma_contribution += contributions.sum(axis=1)
+        
+        # 从未激活的路径贡献为0，收益即为-cost_factor
+        return gamma_contribution - self.cost_factor
+    
+    def simulate_gan_payoffs(self, num_paths, time_chunk=256, random_seed=None, return_greeks=False, band_bump=None):
+        """
+        按时间分块模拟路径并同时累计GAN收益，内存占用为O(num_paths × time_chunk)
+        
+        return_greeks为True时在同一遍模拟中累计逐路径的敏感度估计量（已乘以S0·e^{-rT}）：
+            delta: 似然比法，得分函数为首步增量 Z_1/(S0·σ·√dt)
+            vega: 似然比法（得分Σ[(Z²-1)/σ - Z·√dt]）加上Gamma对σ的显式导数Γ·(d1·d2-1)/σ
+            band_sensitivity: 同一路径上带宽δ±h两组掩码的中心差分
+            amplification_sensitivity: 对放大系数的导数（收益关于放大系数线性）
+        
+        参数:
+            num_paths (int): 模拟路径数量
+            time_chunk (int): 每个时间块的步数
+            random_seed (int): 随机数种子，用于复现结果
+            return_greeks (bool): 是否同时返回敏感度估计量
+            band_bump (float): 带宽差分步长h，默认为0.05·δ
             
         返回:
-            float: 普通跨式组合的收益率
+            numpy.ndarray: 每条路径的GAN收益率；return_greeks为True时返回(收益率, 敏感度估计量字典)
         """
-        # 计算期权定价参数
-        final_price = price_path[-1]
-        call_payoff = max(0, final_price - self.K)
-        put_payoff = max(0, self.K - final_price)
+        gamma_contribution = np.zeros(num_paths)
         
-        # 计算期权初始价格
+        if not return_greeks:
+            for times, prev_prices, prices, _ in self.iterate_path_chunks(num_paths, time_chunk, random_seed):
+                _, contributions = self.calculate_gamma_contributions(prev_prices, prices, times)
+                gamma_contribution += contributions.sum(axis=1)
+            
+            return gamma_contribution - self.cost_factor
+        
+        h = 0.05 * self.delta if band_bump is None else band_bump
+        sqrt_dt = np.sqrt(self.dt)
+        score_S0 = None
+        score_sigma = np.zeros(num_paths)
+        vega_explicit = np.zeros(num_paths)
+        band_up = np.zeros(num_paths)
+        band_down = np.zeros(num_paths)
+        
+        for times, prev_prices, prices, z in self.iterate_path_chunks(num_paths, time_chunk, random_seed):
+            if score_S0 is None:
+                score_S0 = z[:, 0] / (self.S0 * self.sigma * sqrt_dt)
+            score_sigma += ((z**2 - 1) / self.sigma - z * sqrt_dt).sum(axis=1)
+            
+            # 在放宽后的带宽δ+h内计算一次逐步贡献，再按三组带宽掩码分别累加
+            rows, cols = np.nonzero(np.abs(prices - self.K) <= self.delta + h)
+            current_price = prices[rows, cols]
+            previous_price = prev_prices[rows, cols]
+            price_change = (current_price - previous_price) / previous_price
+            step_times = times[cols]
+            contributions = self.calculate_gamma(current_price, step_times) * self.amplification_factor * price_change**2
+            
+            in_band = (current_price >= self.activation_low) & (current_price <= self.activation_high)
+            inner_band = np.abs(current_price - self.K) <= self.delta - h
+            
+            tau = np.maximum(self.T - step_times, 1e-10)
+            d1 = (np.log(current_price / self.K) + (self.r + 0.5 * self.sigma**2) * tau) / (self.sigma * np.sqrt(tau))
+            d2 = d1 - self.sigma * np.sqrt(tau)
+            
+            gamma_contribution += np.bincount(rows, weights=contributions * in_band, minlength=num_paths)
+            vega_explicit += np.bincount(rows, weights=contributions * in_band * (d1 * d2 - 1) / self.sigma,
+                                         minlength=num_paths)
+            band_up += np.bincount(rows, weights=contributions, minlength=num_paths)
+            band_down += np.bincount(rows, weights=contributions * inner_band, minlength=num_paths)
+        
+        payoffs = gamma_contribution - self.cost_factor
+        discount = np.exp(-self.r * self.T)
+        scale = self.S0 * discount
+        
+        # 得分函数均值为0，故似然比项只需乘以与参数相关的Gamma贡献，常数成本不引入额外方差
+        greeks = {
+            'delta': discount * payoffs + scale * gamma_contribution * score_S0,
+            'vega': scale * (gamma_contribution * score_sigma + vega_explicit),
+            'band_sensitivity': scale * (band_up - band_down) / (2 * h),
+            'amplification_sensitivity': scale * gamma_contribution / self.amplification_factor
+        }
+        
+        return payoffs, greeks
+    
+    def sweep_activation_band(self, deltas, centers=None, num_paths=10000, time_chunk=256, random_seed=None):
+        """
+        用同一组模拟路径（共同随机数）同时计算多组激活带宽δ和激活中心K下的GAN收益
+        
+        每个激活中心的逐步Gamma·r²贡献只计算一次，再按价格到中心的距离|S-K|
+        落入的最小带宽分桶累加，最后沿带宽方向累计求和，即得到每个δ下的收益。
+        
+        参数:
+            deltas (array-like): 激活带宽网格
+            centers (array-like): 激活中心网格，默认为[self.K]
+            num_paths (int): 模拟路径数量
+            time_chunk (int): 每个时间块的步数
+            random_seed (int): 随机数种子，用于复现结果
+            
+        返回:
+            dict: 包含以下键，数组形状均为(len(centers), len(deltas))
+                'mean_payoff': 平均GAN收益率
+                'std_error': 平均收益率的标准误
+                'activation_prob': 路径曾进入激活区间的比例，与activation_probability_fast口径一致，包含t=0的初始价格
+                'price': GAN价格
+        """
+        deltas = np.asarray(deltas, dtype=float)
+        centers = np.atleast_1d(np.asarray(self.K if centers is None else centers, dtype=float))
+        order = np.argsort(deltas)
+        sorted_deltas = deltas[order]
+        num_deltas = len(deltas)
+        max_delta = sorted_deltas[-1]
+        
+        # binned[c, i, k]: 第c个中心、第i条路径中距离落在第k个带宽桶的贡献之和
+        binned = np.zeros((len(centers), num_paths, num_deltas))
+        # 激活比例包含t=0：距离从初始价格到各中心的距离开始取最小
+        min_distance = np.broadcast_to(np.abs(self.S0 - centers)[:, None], (len(centers), num_paths)).copy()
+        
+        for times, prev_prices, prices, _ in self.iterate_path_chunks(num_paths, time_chunk, random_seed):
+            price_change = (prices - prev_prices) / prev_prices
+            
+            for c, center in enumerate(centers):
+                distance = np.abs(prices - center)
+                np.minimum(min_distance[c], distance.min(axis=1), out=min_distance[c])
+                
+                # 只计算落在最大带宽内的点
+                rows, cols = np.nonzero(distance <= max_delta)
+                gamma = self.calculate_gamma(prices[rows, cols], times[cols], K=center)
+                contributions = gamma * self.amplification_factor * price_change[rows, cols]**2
+                bucket = np.searchsorted(sorted_deltas, distance[rows, cols], side='left')
+                binned[c] += np.bincount(
+                    rows * num_deltas + bucket, weights=contributions, minlength=num_paths * num_deltas
+                ).reshape(num_paths, num_deltas)
+        
+        # 带宽δ_k内的贡献 = 所有不超过δ_k的桶之和
+        payoffs = np.cumsum(binned, axis=2) - self.cost_factor
+        mean_payoff = payoffs.mean(axis=1)[:, np.argsort(order)]
+        std_error = (payoffs.std(axis=1) / np.sqrt(num_paths))[:, np.argsort(order)]
+        activation_prob = (min_distance[:, :, None] <= deltas[None, None, :]).mean(axis=1)
+        
+        return {
+            'deltas': deltas,
+            'centers': centers,
+            'mean_payoff': mean_payoff,
+            'std_error': std_error,
+            'activation_prob': activation_prob,
+            'price': self.S0 * np.exp(-self.r * self.T) * mean_payoff
+        }
+    
+    def straddle_initial_cost(self):
+        """
+        计算普通跨式组合(Long Straddle)的Black-Scholes初始价格
+        
+        返回:
+            float: 看涨与看跌期权价格之和
+        """
         d1 = (np.log(self.S0 / self.K) + (self.r + 0.5 * self.sigma**2) * self.T) / (self.sigma * np.sqrt(self.T))
         d2 = d1 - self.sigma * np.sqrt(self.T)
         
         call_price = self.S0 * norm.cdf(d1) - self.K * np.exp(-self.r * self.T) * norm.cdf(d2)
         put_price = self.K * np.exp(-self.r * self.T) * norm.cdf(-d2) - self.S0 * norm.cdf(-d1)
         
-        initial_cost = call_price + put_price
-        final_value = call_payoff + put_payoff
+        return call_price + put_price
+    
+    def calculate_vanilla_straddle_payoff(self, price_path, initial_cost=None):
+        """
+        计算普通跨式组合(Long Straddle)在给定价格路径下的收益
+        
+        参数:
+            price_path (numpy.ndarray): 单条价格路径，或形状为(num_paths, steps)的路径矩阵
+            initial_cost (float): 跨式组合初始价格，默认按Black-Scholes计算
+            
+        返回:
+            float或numpy.ndarray: 普通跨式组合的收益率
+        """
+        if initial_cost is None:
+            initial_cost = self.straddle_initial_cost()
+        
+        # 跨式组合到期价值 = 看涨收益 + 看跌收益 = |S_T - K|
+        final_price = np.asarray(price_path)[..., -1]
+        final_value = np.abs(final_price - self.K)
         
         # 计算收益率
         return (final_value - initial_cost) / initial_cost
     
-    def price_gan(self, num_simulations=10000):
+    def price_gan(self, num_simulations=10000, batch_size=10000, return_greeks=False):
         """
         通过蒙特卡洛模拟为GAN产品定价
         
         参数:
             num_simulations (int): 模拟次数
+            batch_size (int): 每批同时模拟的路径数量；内存随 batch_size × time_chunk 线性增长，
+                默认 10000 × 256 时单批峰值约 300MB
+            return_greeks (bool): 是否在同一遍模拟中同时估计敏感度
             
         返回:
-            float: GAN产品价格
+            float: GAN产品价格；return_greeks为True时返回包含价格、
+                delta、vega、band_sensitivity、amplification_sensitivity及其标准误的字典
         """
         total_payoff = 0
-        
-        for _ in range(num_simulations):
-            price_path = self.simulate_price_path(1)[0]
-            payoff = self.calculate_gan_payoff(price_path)
-            total_payoff += payoff
+        greek_sums = {}
+        greek_square_sums = {}
+        
+        for start in range(0, num_simulations, batch_size):
+            batch_paths = min(batch_size, num_simulations - start)
+            if not return_greeks:
+                payoffs = self.simulate_gan_payoffs(batch_paths)
+                total_payoff += payoffs.sum()
+                continue
+            
+            payoffs, greeks = self.simulate_gan_payoffs(batch_paths, return_greeks=True)
+            total_payoff += payoffs.sum()
+            for name, samples in greeks.items():
+                greek_sums[name] = greek_sums.get(name, 0.0) + samples.sum()
+                greek_square_sums[name] = greek_square_sums.get(name, 0.0) + (samples**2).sum()
         
         # 平均收益率
         average_payoff = total_payoff / num_simulations
@@ -220,70 +464,284 @@ class GammaAmplifierNote:
         # GAN初始价格 = 标的资产价格 * 期望收益折现
         gan_price = self.S0 * np.exp(-self.r * self.T) * average_payoff
         
-        return gan_price
+        if not return_greeks:
+            return gan_price
+        
+        results = {'price': gan_price}
+        for name in greek_sums:
+            mean = greek_sums[name] / num_simulations
+            variance = max(greek_square_sums[name] / num_simulations - mean**2, 0.0)
+            results[name] = mean
+            results[f'{name}_std_error'] = np.sqrt(variance / num_simulations)
+        
+        return results
     
-    def run_backtest(self, num_paths=1000, output_file="pricing_result.csv"):
+    def _band_integral(self, mean, var, k):
         """
-        运行回测模拟并生成结果
+        计算∫ N(x; mean, var)·e^{kx} dx 在激活区间[ln(K-δ), ln(K+δ)]上的值（x为对数价格）
+        """
+        low = np.log(self.activation_low) if self.activation_low > 0 else -np.inf
+        high = np.log(self.activation_high)
+        sd = np.sqrt(var)
+        shifted = mean + k * var
+        return np.exp(k * mean + 0.5 * k**2 * var) * (norm.cdf((high - shifted) / sd) - norm.cdf((low - shifted) / sd))
+    
+    def expected_gamma_contributions(self):
+        """
+        半解析计算每个监测步Gamma贡献的期望 E[1{S_t∈激活区间}·Γ(S_t,t)·A·r_t²]
+        
+        对数价格x = ln S_t服从正态分布，Γ(S,t) = N(x; c, σ²τ)·e^{-x}也是x的高斯核，
+        因此转移密度与区间内Gamma的乘积可以在价格维度上解析积分；给定S_t时单步对数收益
+        服从布朗桥条件分布，E[r_t²|S_t]同样是e^{kx}形式。时间维度按实际监测步逐点求和，
+        与蒙特卡洛的离散监测口径完全一致。
+        
+        返回:
+            numpy.ndarray: 每个监测步的期望Gamma贡献，形状(total_steps,)
+        """
+        n = np.arange(1, self.total_steps + 1)
+        tau = np.maximum(self.T - n * self.dt, 1e-10)
+        
+        # 单步对数收益 X ~ N(mu, v)，ln S_t ~ N(m, w2)
+        mu = (self.r - 0.5 * self.sigma**2) * self.dt
+        v = self.sigma**2 * self.dt
+        m = np.log(self.S0) + mu * n
+        w2 = v * n
+        
+        # Gamma核：Γ = N(x; c, s2)·e^{-x}
+        s2 = self.sigma**2 * tau
+        c = np.log(self.K) - (self.r + 0.5 * self.sigma**2) * tau
+        
+        # 两个高斯密度之积 = N(c; m, s2+w2)·N(x; M0, V0)
+        total_var = s2 + w2
+        weight = norm.pdf(c, loc=m, scale=np.sqrt(total_var))
+        M0 = (c * w2 + m * s2) / total_var
+        V0 = s2 * w2 / total_var
+        
+        # 给定x时 X ~ N(mu + beta·(x - m), vc)，E[r²|x] = e^{2μc+2vc} - 2e^{μc+vc/2} + 1
+        beta = 1.0 / n
+        vc = v * (1 - beta)
+        term_square = np.exp(2 * (mu - beta * m) + 2 * vc) * self._band_integral(M0, V0, 2 * beta - 1)
+        term_linear = -2 * np.exp(mu - beta * m + 0.5 * vc) * self._band_integral(M0, V0, beta - 1)
+        term_const = self._band_integral(M0, V0, -1)
+        
+        return self.amplification_factor * weight * (term_square + term_linear + term_const)
+    
+    def activation_probability_fast(self):
+        """
+        用首达时公式估计价格在存续期内进入激活区间的概率
+        
+        口径与回测的"是否曾激活"一致，包含t=0的初始价格：初始价格在区间内时概率为1；
+        否则为带漂移布朗运动首次到达区间较近边界的概率，
+        并按Broadie-Glasserman-Kou方法将边界外移0.5826·σ·√dt以近似离散监测。
+        
+        返回:
+            float: 激活概率
+        """
+        if self.activation_low <= self.S0 <= self.activation_high:
+            return 1.0
+        
+        nu = self.r - 0.5 * self.sigma**2
+        vol = self.sigma * np.sqrt(self.T)
+        shift = 0.5826 * self.sigma * np.sqrt(self.dt)
+        
+        if self.S0 < self.activation_low:
+            # 向上首达下边界
+            b = np.log(self.activation_low / self.S0) + shift
+            return float(norm.cdf((-b + nu * self.T) / vol)
+                         + np.exp(2 * nu * b / self.sigma**2) * norm.cdf((-b - nu * self.T) / vol))
+        
+        if self.activation_low <= 0:
+            return 0.0
+        
+        # 向下首达上边界
+        b = np.log(self.activation_high / self.S0) - shift
+        return float(norm.cdf((b - nu * self.T) / vol)
+                     + np.exp(2 * nu * b / self.sigma**2) * norm.cdf((b + nu * self.T) / vol))
+    
+    def price_gan_fast(self):
+        """
+        半解析快速定价，不需要模拟路径，适用于条款报价界面
+        
+        返回:
+            dict: 'price'为GAN价格，'expected_payoff'为期望收益率，'activation_prob'为激活概率
+        """
+        expected_payoff = self.expected_gamma_contributions().sum() - self.cost_factor
+        
+        return {
+            'price': self.S0 * np.exp(-self.r * self.T) * expected_payoff,
+            'expected_payoff': expected_payoff,
+            'activation_prob': self.activation_probability_fast()
+        }
+    
+    def cross_validate_fast_pricer(self, num_simulations=100000, time_chunk=256, random_seed=None, batch_size=10000):
+        """
+        将半解析快速定价与蒙特卡洛定价进行交叉验证
+        
+        激活比例与activation_probability_fast采用同一口径，包含t=0的初始价格，
+        因此初始价格在激活区间内时两者均为1。
         
         参数:
-            num_paths (int): 模拟路径数量
-            output_file (str): 结果输出文件名
+            num_simulations (int): 蒙特卡洛模拟次数
+            time_chunk (int): 每个时间块的步数
+            random_seed (int): 随机数种子，用于复现结果
+            batch_size (int): 每批同时模拟的路径数量
             
         返回:
-            pandas.DataFrame: 回测结果数据框
+            dict: 快速定价与蒙特卡洛的价格、激活概率，以及对应的蒙特卡洛标准误和z值
         """
-        # 初始化结果列表
-        results = []
+        fast_quote = self.price_gan_fast()
         
-        # 执行多路径模拟
-        price_paths = self.simulate_price_path(num_paths)
+        if random_seed is not None:
+            np.random.seed(random_seed)
         
-        # 计算每条路径的GAN收益和普通策略收益
-        for i in tqdm(range(num_paths), desc="模拟回测进度"):
-            path = price_paths[i]
-            
-            # 计算GAN产品收益
-            gan_payoff = self.calculate_gan_payoff(path)
-            
-            # 计算普通策略收益
-            vanilla_payoff = self.calculate_vanilla_straddle_payoff(path)
+        gamma_contribution = np.zeros(num_simulations)
+        activated = np.full(num_simulations, bool(self.is_activated(self.S0)))
+        for start in range(0, num_simulations, batch_size):
+            stop = min(start + batch_size, num_simulations)
+            for times, prev_prices, prices, _ in self.iterate_path_chunks(stop - start, time_chunk):
+                in_band, contributions = self.calculate_gamma_contributions(prev_prices, prices, times)
+                gamma_contribution[start:stop] += contributions.sum(axis=1)
+                activated[start:stop] |= in_band.any(axis=1)
+        
+        discount = self.S0 * np.exp(-self.r * self.T)
+        payoffs = gamma_contribution - self.cost_factor
+        mc_price = discount * payoffs.mean()
+        mc_std_error = discount * payoffs.std() / np.sqrt(num_simulations)
+        
+        # 激活概率的二项标准误按快速公式的概率计算，概率为0或1时两者应完全一致
+        fast_prob = fast_quote['activation_prob']
+        mc_prob = activated.mean()
+        prob_std_error = np.sqrt(fast_prob * (1 - fast_prob) / num_simulations)
+        if prob_std_error > 0:
+            prob_z_score = (fast_prob - mc_prob) / prob_std_error
+        else:
+            prob_z_score = 0.0 if fast_prob == mc_prob else np.inf
+        
+        return {
+            'fast_price': fast_quote['price'],
+            'mc_price': mc_price,
+            'mc_std_error': mc_std_error,
+            'z_score': (fast_quote['price'] - mc_price) / mc_std_error if mc_std_error > 0 else 0.0,
+            'fast_activation_prob': fast_prob,
+            'mc_activation_prob': mc_prob,
+            'activation_std_error': prob_std_error,
+            'activation_z_score': prob_z_score
+        }
+    
+    def simulate_path_statistics(self, num_paths, time_chunk=256, random_seed=None):
+        """
+        按时间分块模拟路径，同时累计回测需要的逐路径统计量，不保存完整路径
+        
+        参数:
+            num_paths (int): 模拟路径数量
+            time_chunk (int): 每个时间块的步数
+            random_seed (int): 随机数种子，用于复现结果
             
-            # 记录路径中价格是否曾进入激活区间
-            ever_activated = any(self.is_activated(p) for p in path)
+        返回:
+            dict: 每条路径的GAN收益率、是否曾激活、最终/最高/最低价格和实现波动率
+        """
+        gamma_contribution = np.zeros(num_paths)
+        # 与逐点判断一致，初始价格也计入是否曾激活和最高/最低价格
+        ever_activated = np.full(num_paths, bool(self.is_activated(self.S0)))
+        max_price = np.full(num_paths, float(self.S0))
+        min_price = np.full(num_paths, float(self.S0))
+        final_price = max_price.copy()
+        return_sum = np.zeros(num_paths)
+        return_square_sum = np.zeros(num_paths)
+        
+        for times, prev_prices, prices, _ in self.iterate_path_chunks(num_paths, time_chunk, random_seed):
+            in_band, contributions = self.calculate_gamma_contributions(prev_prices, prices, times)
+            gamma_contribution += contributions.sum(axis=1)
+            ever_activated |= in_band.any(axis=1)
+            np.maximum(max_price, prices.max(axis=1), out=max_price)
+            np.minimum(min_price, prices.min(axis=1), out=min_price)
+            final_price = prices[:, -1]
             
-            # 计算价格路径统计量
-            price_volatility = np.std(np.diff(path) / path[:-1])
-            final_price = path[-1]
-            max_price = np.max(path)
-            min_price = np.min(path)
-            price_range = max_price - min_price
+            returns = (prices - prev_prices) / prev_prices
+            return_sum += returns.sum(axis=1)
+            return_square_sum += (returns**2).sum(axis=1)
+        
+        # 单步收益率的总体标准差
+        mean_return = return_sum / self.total_steps
+        variance = return_square_sum / self.total_steps - mean_return**2
+        
+        return {
+            'gan_payoff': gamma_contribution - self.cost_factor,
+            'ever_activated': ever_activated,
+            'final_price': final_price,
+            'max_price': max_price,
+            'min_price': min_price,
+            'realized_volatility': np.sqrt(np.maximum(variance, 0))
+        }
+    
+    def run_backtest(self, num_paths=1000, output_file="pricing_result.csv", batch_size=10000,
+                     time_chunk=256, generate_charts=True):
+        """
+        运行回测模拟并生成结果
+        
+        每列结果按批写入预分配的数组，最后整体构造DataFrame；
+        输出文件以.parquet结尾时写Parquet，否则写CSV。
+        
+        参数:
+            num_paths (int): 模拟路径数量
+            output_file (str): 结果输出文件名
+            batch_size (int): 每批同时模拟的路径数量；内存随 batch_size × time_chunk 线性增长，
+                默认 10000 × 256 时单批峰值约 300MB
+            time_chunk (int): 每个时间块的步数
+            generate_charts (bool): 是否生成分析图表
             
-            # 保存结果
-            results.append({
-                '路径ID': i,
-                'GAN收益率': gan_payoff,
-                '普通策略收益率': vanilla_payoff,
-                '收益放大倍数': gan_payoff / vanilla_payoff if vanilla_payoff != 0 else float('nan'),
-                '是否曾激活': ever_activated,
-                '最终价格': final_price,
-                '最高价格': max_price,
-                '最低价格': min_price,
-                '价格区间': price_range,
-                '实现波动率': price_volatility,
-                '初始价格': self.S0,
-                '激活中心': self.K,
-                '激活带宽': self.delta
-            })
-        
-        # 转换为DataFrame
-        results_df = pd.DataFrame(results)
-        
-        # 保存结果到CSV
-        results_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+        返回:
+            pandas.DataFrame: 回测结果数据框
+        """
+        gan_payoff = np.empty(num_paths)
+        ever_activated = np.empty(num_paths, dtype=bool)
+        final_price = np.empty(num_paths)
+        max_price = np.empty(num_paths)
+        min_price = np.empty(num_paths)
+        price_volatility = np.empty(num_paths)
+        
+        # 分批模拟，计算每条路径的GAN收益和路径统计量
+        for start in tqdm(range(0, num_paths, batch_size), desc="模拟回测进度"):
+            stop = min(start + batch_size, num_paths)
+            stats = self.simulate_path_statistics(stop - start, time_chunk)
+            gan_payoff[start:stop] = stats['gan_payoff']
+            ever_activated[start:stop] = stats['ever_activated']
+            final_price[start:stop] = stats['final_price']
+            max_price[start:stop] = stats['max_price']
+            min_price[start:stop] = stats['min_price']
+            price_volatility[start:stop] = stats['realized_volatility']
+        
+        # 普通策略收益，跨式组合初始价格只计算一次
+        vanilla_payoff = self.calculate_vanilla_straddle_payoff(final_price[:, None], self.straddle_initial_cost())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            amplification = np.where(vanilla_payoff != 0, gan_payoff / vanilla_payoff, np.nan)
+        
+        # 按列构造DataFrame
+        results_df = pd.DataFrame({
+            '路径ID': np.arange(num_paths),
+            'GAN收益率': gan_payoff,
+            '普通策略收益率': vanilla_payoff,
+            '收益放大倍数': amplification,
+            '是否曾激活': ever_activated,
+            '最终价格': final_price,
+            '最高价格': max_price,
+            '最低价格': min_price,
+            '价格区间': max_price - min_price,
+            '实现波动率': price_volatility,
+            '初始价格': np.full(num_paths, self.S0),
+            '激活中心': np.full(num_paths, self.K),
+            '激活带宽': np.full(num_paths, self.delta)
+        })
+        
+        # 保存结果
+        if output_file.endswith('.parquet'):
+            results_df.to_parquet(output_file, index=False)
+        else:
+            results_df.to_csv(output_file, index=False, encoding='utf-8-sig')
         
         # 生成分析图表
-        self.generate_analysis_charts(results_df)
+        if generate_charts:
+            self.generate_analysis_charts(results_df)
         
         return results_df
     
@@ -373,27 +831,13 @@ class GammaAmplifierNote:
         plt.savefig('simulation_charts/波动率与收益关系.png', dpi=300, bbox_inches='tight')
         plt.close()
         
-        # 6. 不同激活带宽对收益的影响模拟
-        delta_range = np.linspace(0.5, 5, 10)
-        avg_payoffs = []
-        
-        for delta in delta_range:
-            temp_gan = GammaAmplifierNote(
-                S0=self.S0, 
-                K=self.K, 
-                delta=delta, 
-                T=self.T, 
-                r=self.r, 
-                sigma=self.sigma
-            )
-            
-            # 模拟较少条路径以加快速度
-            paths = temp_gan.simulate_price_path(50)
-            payoffs = [temp_gan.calculate_gan_payoff(path) for path in paths]
-            avg_payoffs.append(np.mean(payoffs))
+        # 6. 不同激活带宽对收益的影响模拟（同一组路径一次计算全部带宽）
+        delta_range = np.linspace(0.5, 5, 50)
+        band_sweep = self.sweep_activation_band(delta_range, num_paths=5000)
+        avg_payoffs = band_sweep['mean_payoff'][0]
         
         plt.figure(figsize=(12, 8))
-        plt.plot(delta_range, avg_payoffs, marker='o')
+        plt.plot(delta_range, avg_payoffs, marker='o', markersize=3)
         plt.title('激活带宽δ对GAN平均收益的影响', fontsize=15)
         plt.xlabel('激活带宽δ', fontsize=12)
         plt.ylabel('平均GAN收益率', fontsize=12)
@@ -487,6 +931,24 @@ def main():
     except Exception as e:
         print(f"GAN定价计算出错: {str(e)}")
     
+    # 半解析快速定价，并与蒙特卡洛交叉验证
+    try:
+        fast_quote = gan_model.price_gan_fast()
+        print(f"GAN快速定价结果: {fast_quote['price']:.4f} (激活概率: {fast_quote['activation_prob']:.2%})")
+        validation = gan_model.cross_validate_fast_pricer(num_simulations=20000)
+        print(f"蒙特卡洛对照: {validation['mc_price']:.4f} ± {1.96 * validation['mc_std_error']:.4f} "
+              f"(z = {validation['z_score']:.2f}, 激活比例: {validation['mc_activation_prob']:.2%}, "
+              f"激活z = {validation['activation_z_score']:.2f})")
+        
+        # 初始价格在激活区间外时，激活概率走首达时公式
+        outside_model = GammaAmplifierNote(S0=S0 * 0.95, K=K, delta=delta, T=T, r=r, sigma=sigma,
+                                           steps_per_day=10, amplification_factor=2.5, cost_factor=0.05)
+        outside = outside_model.cross_validate_fast_pricer(num_simulations=20000)
+        print(f"区间外初始价格 S0={outside_model.S0:.1f}: 快速激活概率 {outside['fast_activation_prob']:.2%}, "
+              f"蒙特卡洛 {outside['mc_activation_prob']:.2%} (z = {outside['activation_z_score']:.2f})")
+    except Exception as e:
+        print(f"GAN快速定价计算出错: {str(e)}")
+    
     # 运行回测模拟
     print("开始回测模拟...")
     try:
@@ -12,14 +12,45 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import scipy.stats as stats
 from scipy.stats import norm
+from scipy.special import ndtr
 
 # 确保输出目录存在
 if not os.path.exists('simulation_charts'):
     os.makedirs('simulation_charts')
 
+def black_scholes_call_delta(S, t, K, r, sigma, T):
+    """
+    计算Black-Scholes欧式看涨期权的Delta，所有参数均可为可广播的数组
+    
+    参数:
+    S: 标的价格
+    t: 已经过的时间(年)
+    K, r, sigma, T: 行权价格、无风险利率、波动率和到期日(年)
+    
+    返回:
+    Delta值，到期及之后为0；输入为标量时返回float
+    """
+    S = np.asarray(S)
+    t = np.asarray(t)
+    if not np.issubdtype(S.dtype, np.floating):
+        S = S.astype(float)
+    if not np.issubdtype(t.dtype, np.floating):
+        t = t.astype(float)
+    
+    # 到期及之后Delta为0
+    tau = T - t
+    alive = (t < T) & (tau > 0)
+    safe_tau = np.where(alive, tau, 1.0)
+    
+    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * safe_tau) / (sigma * np.sqrt(safe_tau))
+    delta = np.where(alive, ndtr(d1), 0.0)
+    return delta if delta.ndim else float(delta)
+
 class LagArbNote:
     """Lag-Arb Note定价模型类"""
     
@@ -60,28 +91,20 @@ class LagArbNote:
         self.results_df = None
         
     def black_scholes_delta(self, S, t):
-        """计算Black-Scholes欧式看涨期权的Delta"""
-        if t >= self.T:
-            return 0.0
-        
-        tau = self.T - t
-        if tau <= 0:
-            return 0.0
-            
-        d1 = (np.log(S / self.K) + (self.r + 0.5 * self.sigma**2) * tau) / (self.sigma * np.sqrt(tau))
-        return norm.cdf(d1)
+        """计算Black-Scholes欧式看涨期权的Delta，S与t可以是可广播的数组（保留float32精度）"""
+        return black_scholes_call_delta(S, t, self.K, self.r, self.sigma, self.T)
     
     def simulate_price_paths(self):
         """模拟标的资产价格路径"""
         dt = self.dt
-        prices = np.zeros((self.num_simulations, self.num_steps + 1))
-        prices[:, 0] = self.S0
         
-        for i in range(self.num_simulations):
-            for t in range(1, self.num_steps + 1):
-                z = np.random.standard_normal()
-                prices[i, t] = prices[i, t-1] * np.exp((self.r - 0.5 * self.sigma**2) * dt + 
-                                                       self.sigma * np.sqrt(dt) * z)
+        # 按路径顺序一次生成全部随机数，对数收益累加后取指数
+        z = np.random.standard_normal((self.num_simulations, self.num_steps))
+        log_returns = (self.r - 0.5 * self.sigma**2) * dt + self.sigma * np.sqrt(dt) * z
+        
+        prices = np.empty((self.num_simulations, self.num_steps + 1))
+        prices[:, 0] = self.S0
+        prices[:, 1:] = self.S0 * np.exp(np.cumsum(log_returns, axis=1))
                 
         self.simulated_prices = prices
         return prices
@@ -90,13 +113,10 @@ class LagArbNote:
         """计算每个价格路径对应的Delta值"""
         if self.simulated_prices is None:
             self.simulate_price_paths()
-            
-        deltas = np.zeros_like(self.simulated_prices)
         
-        for i in range(self.num_simulations):
-            for t in range(self.num_steps + 1):
-                time_to_expiry = t * self.dt
-                deltas[i, t] = self.black_scholes_delta(self.simulated_prices[i, t], time_to_expiry)
+        # 各时间点已经过的时间，广播到所有路径后一次计算全部Delta
+        time_to_expiry = np.arange(self.num_steps + 1) * self.dt
+        deltas = self.black_scholes_delta(self.simulated_prices, time_to_expiry[None, :])
                 
         self.simulated_deltas = deltas
         return deltas
@@ -106,12 +126,9 @@ class LagArbNote:
         if self.simulated_deltas is None:
             self.calculate_deltas()
             
-        # 计算滞后delta变化
-        delta_changes = np.zeros((self.num_simulations, self.num_steps + 1 - self.tau_days))
-        
-        for i in range(self.num_simulations):
-            for t in range(self.num_steps + 1 - self.tau_days):
-                delta_changes[i, t] = self.simulated_deltas[i, t + self.tau_days] - self.simulated_deltas[i, t]
+        # 计算滞后delta变化：相隔tau_days的两段切片相减
+        num_changes = self.num_steps + 1 - self.tau_days
+        delta_changes = self.simulated_deltas[:, self.tau_days:] - self.simulated_deltas[:, :num_changes]
                 
         self.delta_changes = delta_changes
         return delta_changes
@@ -150,15 +167,155 @@ class LagArbNote:
         # 计算每个时间点的触发概率
         trigger_probs = np.mean(self.triggers, axis=0)
         
+        results, self.results_df = self._summarize(path_triggers, payouts,
+                                                   np.max(np.abs(self.delta_changes), axis=1))
+        
+        return results, self.results_df, trigger_probs
+    
+    def run_streaming(self, block_size=256, dtype=np.float64):
+        """
+        流式运行模拟：按时间块推进，只保留每条路径最近tau_days个Delta，
+        在线更新最大|Delta变化|和触发标志，内存占用为 O(路径数 × (tau + block_size))。
+        
+        参数:
+        block_size: 每个时间块的时间点数（共 num_steps + 1 个时间点）
+        dtype: 计算精度，可选 np.float32 以进一步减半内存
+        
+        返回:
+        与 run_simulation 相同的 (results, results_df, trigger_probs)。
+        随机数按时间块逐块生成，随机数排列依赖于分块方式：只有 block_size > num_steps
+        （单个时间块覆盖全部 num_steps + 1 个时间点）时才与 run_simulation 使用相同的随机数。
+        """
+        dtype = np.dtype(dtype)
+        n = self.num_simulations
+        tau = self.tau_days
+        num_points = self.num_steps + 1
+        
+        drift = dtype.type((self.r - 0.5 * self.sigma**2) * self.dt)
+        vol = dtype.type(self.sigma * np.sqrt(self.dt))
+        
+        log_S = np.full(n, np.log(self.S0), dtype=dtype)
+        # 滞后缓冲区：按时间顺序保存最近tau个时间点的Delta
+        lag_buffer = np.empty((n, 0), dtype=dtype)
+        max_delta_changes = np.zeros(n, dtype=dtype)
+        path_triggers = np.zeros(n, dtype=bool)
+        trigger_counts = np.zeros(max(num_points - tau, 0), dtype=np.int64)
+        
+        for start in range(0, num_points, block_size):
+            stop = min(start + block_size, num_points)
+            
+            # 生成本时间块的价格（时间点0为初始价格，不消耗随机数）
+            z = np.random.standard_normal((n, stop - max(start, 1))).astype(dtype, copy=False)
+            log_prices = log_S[:, None] + np.cumsum(drift + vol * z, axis=1)
+            if start == 0:
+                log_prices = np.concatenate([log_S[:, None], log_prices], axis=1)
+            log_S = log_prices[:, -1].copy()
+            
+            times = (np.arange(start, stop) * self.dt).astype(dtype)
+            deltas = self.black_scholes_delta(np.exp(log_prices), times[None, :])
+            
+            # 拼接缓冲区后，时间点i的滞后变化为 ext[i] - ext[i - tau]
+            ext = np.concatenate([lag_buffer, deltas], axis=1)
+            offset = lag_buffer.shape[1]
+            first = max(tau - start, 0)
+            if first < stop - start:
+                delta_changes = (ext[:, offset + first:offset + stop - start]
+                                 - ext[:, offset + first - tau:offset + stop - start - tau])
+                abs_changes = np.abs(delta_changes)
+                np.maximum(max_delta_changes, abs_changes.max(axis=1), out=max_delta_changes)
+                
+                triggers = abs_changes > self.epsilon
+                path_triggers |= triggers.any(axis=1)
+                trigger_counts[start + first - tau:stop - tau] += triggers.sum(axis=0)
+            
+            lag_buffer = ext[:, max(ext.shape[1] - tau, 0):].copy()
+        
+        payouts = path_triggers * self.payout
+        trigger_probs = trigger_counts / n
+        results, self.results_df = self._summarize(path_triggers, payouts, max_delta_changes)
+        
+        return results, self.results_df, trigger_probs
+    
+    def run_chain(self, strikes, expiries=None, time_chunk=16):
+        """
+        期权链模式：所有期权共用同一组标的价格路径，按时间块计算
+        (路径数 × 时间块 × 期权数) 的Delta张量，监测每个期权的Delta滞后变化。
+        
+        参数:
+        strikes: 行权价格数组
+        expiries: 到期日数组(年)，与strikes广播后逐一配对，默认为票据到期日T；
+                  需要完整网格时可先用 np.meshgrid 展开。监测窗口为票据存续期，
+                  到期日不得晚于T；到期之后Delta恒为0，之后的滞后变化不计入该期权
+        time_chunk: 每个时间块的步数
+        
+        返回:
+        包含各期权触发概率、任一期权触发概率、期望收益以及路径级结果的字典
+        """
+        strikes, expiries = (np.ravel(a) for a in np.broadcast_arrays(
+            np.asarray(strikes, dtype=float),
+            np.asarray(self.T if expiries is None else expiries, dtype=float)))
+        
+        if np.any(expiries > self.T * (1 + 1e-12)):
+            raise ValueError("期权到期日不能晚于票据到期日T：监测窗口只覆盖票据存续期")
+        
+        if self.simulated_prices is None:
+            self.simulate_price_paths()
+        
+        prices = self.simulated_prices
+        tau = self.tau_days
+        num_points = self.num_steps + 1
+        num_options = len(strikes)
+        # 每个期权最后一个计入的监测点（与单期权模式相同，到期当步计入）
+        last_point = np.floor(expiries / self.dt + 1e-9).astype(int)
+        
+        lag_buffer = np.empty((self.num_simulations, 0, num_options))
+        max_delta_changes = np.zeros((self.num_simulations, num_options))
+        option_triggers = np.zeros((self.num_simulations, num_options), dtype=bool)
+        
+        for start in range(0, num_points, time_chunk):
+            stop = min(start + time_chunk, num_points)
+            
+            # 当前时间块的Delta张量，形状 (路径数, 时间块, 期权数)
+            times = np.arange(start, stop) * self.dt
+            deltas = black_scholes_call_delta(prices[:, start:stop, None], times[None, :, None],
+                                              strikes, self.r, self.sigma, expiries)
+            
+            # 与流式模式相同：拼接滞后缓冲区后相隔tau的切片相减
+            ext = np.concatenate([lag_buffer, deltas], axis=1)
+            offset = lag_buffer.shape[1]
+            first = max(tau - start, 0)
+            if first < stop - start:
+                abs_changes = np.abs(ext[:, offset + first:offset + stop - start]
+                                     - ext[:, offset + first - tau:offset + stop - start - tau])
+                alive = np.arange(start + first, stop)[:, None] <= last_point[None, :]
+                abs_changes = np.where(alive[None, :, :], abs_changes, 0.0)
+                np.maximum(max_delta_changes, abs_changes.max(axis=1), out=max_delta_changes)
+                option_triggers |= (abs_changes > self.epsilon).any(axis=1)
+            
+            lag_buffer = ext[:, max(ext.shape[1] - tau, 0):].copy()
+        
+        any_triggers = option_triggers.any(axis=1)
+        
+        return {
+            'strikes': strikes,
+            'expiries': expiries,
+            'trigger_prob': option_triggers.mean(axis=0),
+            'expected_payout': option_triggers.mean(axis=0) * self.payout,
+            'any_trigger_prob': any_triggers.mean(),
+            'any_expected_payout': any_triggers.mean() * self.payout,
+            'max_delta_changes': max_delta_changes,
+            'option_triggers': option_triggers,
+            'any_triggers': any_triggers
+        }
+    
+    def _summarize(self, path_triggers, payouts, max_delta_changes):
+        """汇总路径级结果，生成结果字典和路径结果数据框"""
         # 计算总体触发概率
         total_trigger_prob = np.mean(path_triggers)
         
         # 期望收益
         expected_payout = np.mean(payouts)
         
-        # 创建结果数据框
-        days = np.arange(self.num_steps + 1 - self.tau_days)
-        
         results = {
             '总体触发概率': total_trigger_prob,
             '期望收益': expected_payout,
@@ -174,22 +331,56 @@ class LagArbNote:
             }
         }
         
-        # 创建路径结果的数据框
-        path_results = []
-        for i in range(self.num_simulations):
-            # 记录每条路径的最大Delta变化和是否触发
-            max_delta_change = np.max(np.abs(self.delta_changes[i]))
-            path_data = {
-                '路径ID': i,
-                '最大Delta变化': max_delta_change,
-                '是否触发': path_triggers[i],
-                '收益': payouts[i]
-            }
-            path_results.append(path_data)
+        # 创建路径结果的数据框：记录每条路径的最大Delta变化和是否触发
+        results_df = pd.DataFrame({
+            '路径ID': np.arange(self.num_simulations),
+            '最大Delta变化': max_delta_changes,
+            '是否触发': path_triggers,
+            '收益': payouts
+        })
         
-        self.results_df = pd.DataFrame(path_results)
+        return results, results_df
+    
+    def trigger_probability_surface(self, taus, epsilons):
+        """
+        基于同一组Delta路径计算 (延迟窗口 τ × 阈值 ε) 的触发概率曲面。
+        每个τ只需一次跨步切片相减得到每条路径的最大|Delta变化|，
+        任意ε的触发概率由这些最大值的经验分布函数直接读出。
         
-        return results, self.results_df, trigger_probs
+        参数:
+        taus: 延迟窗口列表(年)，与构造函数的tau含义相同
+        epsilons: Delta变化阈值列表
+        
+        返回:
+        包含 tau_days、epsilons、trigger_prob 和 expected_payout（形状均为 (τ数, ε数)）
+        以及 max_delta_changes（形状 (τ数, 路径数)）的字典
+        """
+        if self.simulated_deltas is None:
+            self.calculate_deltas()
+        
+        deltas = self.simulated_deltas
+        tau_days = np.array([int(tau * 252) for tau in np.atleast_1d(taus)])
+        epsilons = np.asarray(epsilons, dtype=float)
+        num_points = deltas.shape[1]
+        
+        max_delta_changes = np.empty((len(tau_days), self.num_simulations))
+        for i, lag in enumerate(tau_days):
+            max_delta_changes[i] = np.max(np.abs(deltas[:, lag:] - deltas[:, :num_points - lag]), axis=1)
+        
+        # 经验分布函数：路径触发当且仅当 最大|Delta变化| > ε
+        sorted_max = np.sort(max_delta_changes, axis=1)
+        trigger_prob = np.array([
+            (self.num_simulations - np.searchsorted(row, epsilons, side='right')) / self.num_simulations
+            for row in sorted_max
+        ])
+        
+        return {
+            'tau_days': tau_days,
+            'epsilons': epsilons,
+            'trigger_prob': trigger_prob,
+            'expected_payout': trigger_prob * self.payout,
+            'max_delta_changes': max_delta_changes
+        }
     
     def save_results(self, filename="lag_arb_simulation_results.csv"):
         """保存模拟结果到CSV文件"""
@@ -306,6 +497,18 @@ class LagArbNote:
         plt.savefig('simulation_charts/max_delta_change_distribution.png')
         plt.close()
         
+    def plot_trigger_surface(self, surface):
+        """绘制 (τ × ε) 触发概率曲面热力图"""
+        plt.figure(figsize=(12, 6))
+        plt.pcolormesh(surface['epsilons'], surface['tau_days'], surface['trigger_prob'],
+                       shading='nearest', cmap='viridis', vmin=0, vmax=1)
+        plt.colorbar(label='触发概率')
+        plt.title('Lag-Arb Note 触发概率曲面 (τ × ε)')
+        plt.xlabel('Delta变化阈值 ε')
+        plt.ylabel('延迟窗口 τ (交易日)')
+        plt.savefig('simulation_charts/trigger_surface.png')
+        plt.close()
+        
     def generate_all_charts(self):
         """生成所有图表"""
         self.plot_sample_paths()
@@ -315,72 +518,168 @@ class LagArbNote:
         self.plot_payout_distribution()
         self.plot_delta_change_distribution()
 
+# 各情景组共用的正态随机数，由进程池初始化函数注入，每个工作进程只接收一次
+_SCENARIO_NORMALS = {}
+
+def _init_scenario_worker(normals):
+    """进程池初始化：保存各情景组共用的正态随机数"""
+    global _SCENARIO_NORMALS
+    _SCENARIO_NORMALS = normals
+
+def _simulate_delta_surface(task):
+    """
+    对 (S0, K, r, sigma) 相同的一组情景只计算一次价格和Delta曲面，
+    再在同一曲面上逐个应用延迟窗口、阈值和收益率（进程池工作函数）
+    
+    参数:
+    task: (随机数组键, 情景参数列表)
+    
+    返回:
+    每个情景的 (results, results_df, trigger_probs) 列表
+    """
+    group_key, params_list = task
+    z = _SCENARIO_NORMALS[group_key]
+    models = [LagArbNote(**params) for params in params_list]
+    base = models[0]
+    
+    # 与 simulate_price_paths / calculate_deltas 相同的计算，随机数由调用方统一生成
+    dt = base.dt
+    log_returns = (base.r - 0.5 * base.sigma**2) * dt + base.sigma * np.sqrt(dt) * z
+    prices = np.empty((base.num_simulations, base.num_steps + 1))
+    prices[:, 0] = base.S0
+    prices[:, 1:] = base.S0 * np.exp(np.cumsum(log_returns, axis=1))
+    deltas = base.black_scholes_delta(prices, (np.arange(base.num_steps + 1) * dt)[None, :])
+    
+    # 相同延迟窗口的情景共用一次滞后变化
+    abs_changes_by_tau = {}
+    outputs = []
+    for model in models:
+        tau = model.tau_days
+        if tau not in abs_changes_by_tau:
+            abs_changes_by_tau[tau] = np.abs(deltas[:, tau:] - deltas[:, :deltas.shape[1] - tau])
+        abs_changes = abs_changes_by_tau[tau]
+        
+        triggers = abs_changes > model.epsilon
+        path_triggers = np.any(triggers, axis=1)
+        payouts = path_triggers * model.payout
+        
+        results, results_df = model._summarize(path_triggers, payouts, np.max(abs_changes, axis=1))
+        outputs.append((results, results_df, np.mean(triggers, axis=0)))
+    
+    return outputs
+
+def run_scenarios(scenarios, max_workers=None):
+    """
+    批量运行多个情景：路径数、步数、到期日和种子相同的情景共用同一组正态随机数，
+    随机数在主进程中只生成一次，通过进程池初始化函数交给各工作进程；
+    每个不同的 (S0, K, r, sigma) 只计算一次Delta曲面，延迟窗口、阈值和收益率的变化
+    直接作用在缓存的曲面上，各曲面在进程池中并行。
+    图表不在此生成，由调用方在全部模拟完成后按需绘制。
+    
+    参数:
+    scenarios: 情景列表，每项为 {'name': 名称, 'params': LagArbNote参数}
+    max_workers: 进程数，为1时在当前进程中运行
+    
+    返回:
+    与 scenarios 顺序一致的列表，每项为 {'name', 'results', 'results_df', 'trigger_probs'}
+    """
+    # 先按共享随机数所需的参数分组，组内再按Delta曲面所需的参数分组
+    groups = {}
+    for index, scenario in enumerate(scenarios):
+        model = LagArbNote(**scenario['params'])
+        group_key = (model.num_simulations, model.num_steps, model.T, model.seed)
+        surface_key = (model.S0, model.K, model.r, model.sigma)
+        groups.setdefault(group_key, {}).setdefault(surface_key, []).append(index)
+    
+    # 每组随机数只生成一次，种子和抽样顺序与单独运行时相同
+    normals = {}
+    for group_key in groups:
+        num_simulations, num_steps, _, seed = group_key
+        np.random.seed(seed)
+        normals[group_key] = np.random.standard_normal((num_simulations, num_steps))
+    
+    task_indices = []
+    tasks = []
+    for group_key, surfaces in groups.items():
+        for indices in surfaces.values():
+            task_indices.append(indices)
+            tasks.append((group_key, [scenarios[i]['params'] for i in indices]))
+    
+    if max_workers == 1 or len(tasks) == 1:
+        _init_scenario_worker(normals)
+        task_outputs = list(map(_simulate_delta_surface, tasks))
+        _init_scenario_worker({})
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_scenario_worker,
+                                 initargs=(normals,)) as executor:
+            task_outputs = list(executor.map(_simulate_delta_surface, tasks))
+    
+    outputs = [None] * len(scenarios)
+    for indices, group_outputs in zip(task_indices, task_outputs):
+        for index, (results, results_df, trigger_probs) in zip(indices, group_outputs):
+            outputs[index] = {
+                'name': scenarios[index]['name'],
+                'results': results,
+                'results_df': results_df,
+                'trigger_probs': trigger_probs
+            }
+    
+    return outputs
+
+def build_scenario_grid(base_params, **axes):
+    """
+    由基准参数和若干参数轴生成压力测试情景网格
+    
+    参数:
+    base_params: 基准 LagArbNote 参数
+    axes: 参数名到取值列表的映射，例如 sigma=[0.1, 0.2], epsilon=[0.05, 0.1]
+    
+    返回:
+    情景列表，可直接传给 run_scenarios
+    """
+    names = list(axes)
+    scenarios = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        params = dict(base_params, **dict(zip(names, values)))
+        label = ', '.join(f"{name}={value:g}" for name, value in zip(names, values))
+        scenarios.append({'name': label, 'params': params})
+    return scenarios
+
 # 主函数，运行模拟
 def main():
+    base_params = {
+        'S0': 100,
+        'K': 100,
+        'r': 0.03,
+        'sigma': 0.2,
+        'T': 60/252,
+        'tau': 2/252,
+        'epsilon': 0.1,
+        'payout': 0.05,
+        'num_simulations': 1000
+    }
+    
     # 创建三种不同市场情景的模拟
     scenarios = [
-        {
-            'name': '基准情景',
-            'params': {
-                'S0': 100,
-                'K': 100,
-                'r': 0.03,
-                'sigma': 0.2,
-                'T': 60/252,
-                'tau': 2/252,
-                'epsilon': 0.1,
-                'payout': 0.05,
-                'num_simulations': 1000
-            }
-        },
-        {
-            'name': '高波动情景',
-            'params': {
-                'S0': 100,
-                'K': 100,
-                'r': 0.03,
-                'sigma': 0.3,
-                'T': 60/252,
-                'tau': 2/252,
-                'epsilon': 0.1,
-                'payout': 0.05,
-                'num_simulations': 1000
-            }
-        },
-        {
-            'name': '低波动情景',
-            'params': {
-                'S0': 100,
-                'K': 100,
-                'r': 0.03,
-                'sigma': 0.1,
-                'T': 60/252,
-                'tau': 2/252,
-                'epsilon': 0.1,
-                'payout': 0.05,
-                'num_simulations': 1000
-            }
-        }
+        {'name': '基准情景', 'params': base_params},
+        {'name': '高波动情景', 'params': dict(base_params, sigma=0.3)},
+        {'name': '低波动情景', 'params': dict(base_params, sigma=0.1)}
     ]
     
-    # 存储所有情景的结果
+    # 所有情景共用一组随机数批量模拟
+    print("批量运行情景模拟...")
     all_results = []
     
-    for scenario in scenarios:
-        print(f"运行 {scenario['name']} 模拟...")
-        model = LagArbNote(**scenario['params'])
-        results, results_df, trigger_probs = model.run_simulation()
-        
-        # 为每个情景生成图表
-        print(f"为 {scenario['name']} 生成图表...")
-        model.generate_all_charts()
+    for output in run_scenarios(scenarios):
+        results = output['results']
+        results_df = output['results_df']
         
         # 保存CSV结果
-        results_df['情景'] = scenario['name']
+        results_df['情景'] = output['name']
         all_results.append(results_df)
         
         # 打印结果摘要
-        print(f"\n{scenario['name']}结果摘要:")
+        print(f"\n{output['name']}结果摘要:")
         print(f"总体触发概率: {results['总体触发概率']:.4f}")
         print(f"期望收益: {results['期望收益']:.4f}")
         print("-" * 50)
@@ -390,10 +689,41 @@ def main():
     combined_results.to_csv('lag_arb_simulation_results.csv', index=False)
     print("\n所有模拟结果已保存到 lag_arb_simulation_results.csv")
     
+    # 模拟完成后再绘制基准情景的图表
+    print(f"为 {scenarios[0]['name']} 生成图表...")
+    model = LagArbNote(**scenarios[0]['params'])
+    model.run_simulation()
+    model.generate_all_charts()
+    
+    # 同一组Delta路径上的 (τ × ε) 触发概率曲面
+    surface = model.trigger_probability_surface(taus=np.arange(1, 11) / 252,
+                                                epsilons=np.linspace(0.02, 0.4, 39))
+    model.plot_trigger_surface(surface)
+    
+    # 期权链：不同行权价格和到期日（不晚于票据到期日）共用基准情景的价格路径
+    strike_grid, expiry_grid = np.meshgrid(np.arange(80, 121, 5), np.array([20, 30, 45, 60]) / 252)
+    chain = model.run_chain(strike_grid, expiry_grid)
+    print(f"期权链 ({len(chain['strikes'])} 个期权) 任一期权触发概率: {chain['any_trigger_prob']:.4f}")
+    
     # 生成情景对比图
     print("生成情景对比图...")
     plot_scenario_comparison(combined_results)
     
+    # 波动率 × 阈值 压力测试网格
+    print("运行压力测试网格...")
+    grid = build_scenario_grid(base_params,
+                               sigma=np.round(np.linspace(0.1, 0.4, 10), 3),
+                               epsilon=np.round(np.linspace(0.05, 0.3, 10), 3))
+    grid_outputs = run_scenarios(grid)
+    grid_df = pd.DataFrame([
+        dict(scenario['params'], 情景=output['name'],
+             总体触发概率=output['results']['总体触发概率'],
+             期望收益=output['results']['期望收益'])
+        for scenario, output in zip(grid, grid_outputs)
+    ])
+    grid_df.to_csv('lag_arb_stress_grid.csv', index=False)
+    print(f"{len(grid)} 个压力情景结果已保存到 lag_arb_stress_grid.csv")
+    
 def plot_scenario_comparison(combined_results):
     """生成不同情景对比图"""
     # 计算每个情景的触发率
@@ -3,32 +3,51 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import random
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
 import os
 
 #########################
 # 1. 路径模拟器 (Path Simulator)
 #########################
 
-def simulate_correlated_paths(assets, dt, steps, n_paths, correlation_matrix=None):
+def simulate_correlated_paths(assets, dt, steps, n_paths, correlation_matrix=None,
+                              dtype=np.float64, path_chunk=10000, random_seed=None):
     """
     使用GBM和Cholesky分解模拟相关资产价格路径。
     
+    每个路径块一次生成全部 (时间步, 路径, 资产) 正态随机数，用一次矩阵乘法施加Cholesky因子，
+    对数增量沿时间原地累加后取指数，单块内存约为 path_chunk × steps × n_assets 个元素的两倍。
+    path_chunk 不小于 n_paths 时随机数顺序与逐时间步生成相同。
+    
+    float64 且未给出 random_seed 时沿用全局 np.random 随机数流(可由 np.random.seed 复现)；
+    否则用 np.random.default_rng(random_seed) 按目标精度直接生成正态随机数，
+    float32 不再先生成 float64 再转换，此时需通过 random_seed 复现结果。
+    
     参数:
     - assets: 标的资产列表
     - dt: 时间步长
     - steps: 模拟步数
     - n_paths: 模拟路径数量
     - correlation_matrix: 资产间的相关性矩阵，如果为None则生成随机相关性
+    - dtype: 输出价格的精度，可选 np.float32 以减半内存
+    - path_chunk: 每块模拟的路径数，None表示一次模拟全部路径(内存随路径数线性增长)
+    - random_seed: Generator 的随机种子，见上文
     
     返回:
     - prices: 形状为(n_paths, steps, n_assets)的价格矩阵
     """
     n_assets = len(assets)
-    prices = np.zeros((n_paths, steps, n_assets))
+    prices = np.empty((n_paths, steps, n_assets), dtype=dtype)
     
-    # 初始化第一个时间点的价格
-    for i, asset in enumerate(assets):
-        prices[:, 0, i] = asset['S0']
+    S0 = np.array([asset['S0'] for asset in assets], dtype=dtype)
+    mu = np.array([asset['mu'] for asset in assets], dtype=float)
+    sigma = np.array([asset['sigma'] for asset in assets], dtype=float)
+    
+    # GBM公式中的漂移项和扩散系数
+    drift = ((mu - 0.5 * sigma**2) * dt).astype(dtype)
+    diffusion = (sigma * np.sqrt(dt)).astype(dtype)
     
     # 如果没有提供相关性矩阵，则生成随机相关性
     if correlation_matrix is None:
@@ -45,33 +64,40 @@ def simulate_correlated_paths(assets, dt, steps, n_paths, correlation_matrix=Non
     
     try:
         # Cholesky分解
-        cholesky_matrix = np.linalg.cholesky(correlation_matrix)
-        
-        # 模拟价格路径
-        for t in range(1, steps):
-            # 生成标准正态随机数
-            random_numbers = np.random.normal(0, 1, (n_paths, n_assets))
-            # 应用相关性
-            correlated_random = np.dot(random_numbers, cholesky_matrix.T)
-            
-            for i, asset in enumerate(assets):
-                mu, sigma = asset['mu'], asset['sigma']
-                # GBM公式
-                drift = (mu - 0.5 * sigma**2) * dt
-                diffusion = sigma * np.sqrt(dt) * correlated_random[:, i]
-                prices[:, t, i] = prices[:, t-1, i] * np.exp(drift + diffusion)
-    
+        cholesky_matrix = np.linalg.cholesky(correlation_matrix).astype(dtype)
     except np.linalg.LinAlgError:
         # 如果Cholesky分解失败，退回到简单的无相关性模拟
         print("警告: 相关性矩阵不是正定的，退回到无相关性模拟")
+        cholesky_matrix = None
+    
+    if np.dtype(dtype) == np.float64 and random_seed is None:
+        standard_normal = np.random.standard_normal
+    else:
+        rng = np.random.default_rng(random_seed)
+        standard_normal = partial(rng.standard_normal, dtype=dtype)
+    
+    path_chunk = path_chunk or max(n_paths, 1)
+    for start in range(0, n_paths, path_chunk):
+        stop = min(start + path_chunk, n_paths)
+        
+        if cholesky_matrix is not None:
+            # 按时间步生成标准正态随机数，一次矩阵乘法应用相关性
+            random_numbers = standard_normal((steps - 1, stop - start, n_assets))
+            log_returns = (random_numbers.reshape(-1, n_assets) @ cholesky_matrix.T).reshape(random_numbers.shape)
+            del random_numbers
+        else:
+            # 独立GBM模拟：每个时间步按资产依次生成
+            log_returns = standard_normal((steps - 1, n_assets, stop - start)).transpose(0, 2, 1)
         
-        for t in range(1, steps):
-            for i, asset in enumerate(assets):
-                mu, sigma = asset['mu'], asset['sigma']
-                # 独立GBM模拟
-                drift = (mu - 0.5 * sigma**2) * dt
-                diffusion = sigma * np.sqrt(dt) * np.random.normal(0, 1, n_paths)
-                prices[:, t, i] = prices[:, t-1, i] * np.exp(drift + diffusion)
+        # 对数增量沿时间原地累加并取指数(同一数组依次保存对数增量、累计对数收益和价格)，形状为(时间步, 路径, 资产)
+        log_returns *= diffusion
+        log_returns += drift
+        np.cumsum(log_returns, axis=0, out=log_returns)
+        np.exp(log_returns, out=log_returns)
+        log_returns *= S0
+        prices[start:stop, 0] = S0
+        prices[start:stop, 1:] = log_returns.transpose(1, 0, 2)
+        del log_returns
     
     return prices
 
@@ -121,10 +147,69 @@ def build_dependency_graph(options):
     
     return graph
 
+def _option_edges(option):
+    """期权依赖对应的有向边 (起点, 终点, 类型)，与 build_dependency_graph 的方向一致；bundle 只返回一条"""
+    edges = []
+    for dependency in option.get('dependencies', []):
+        dependency_type = dependency['type']
+        if dependency_type == 'triggered_by':
+            edges.append((dependency['source'], option['id'], dependency_type))
+        elif dependency_type in ('disables', 'bundle'):
+            edges.append((option['id'], dependency['target'], dependency_type))
+    return edges
+
+def analyze_dependency_structure(graph):
+    """
+    基于强连通分量缩合分析依赖图结构。
+    
+    bundle 边是有意的双向边：先把 bundle 连通的期权合并为捆绑组，
+    其余(triggered_by/disables)边在捆绑组之间必须构成DAG。
+    组内出现非 bundle 边，或缩合图中存在非平凡强连通分量，都是非法循环。
+    
+    参数:
+    - graph: NetworkX DiGraph对象
+    
+    返回:
+    - structure: 字典，包含 bundles(捆绑组列表)、illegal_cycles(非法循环涉及的期权集合列表)
+      和 topological_order(无非法循环时按拓扑顺序排列的捆绑组，否则为None)
+    """
+    bundle_graph = nx.Graph()
+    bundle_graph.add_nodes_from(graph)
+    bundle_graph.add_edges_from((u, v) for u, v, data in graph.edges(data=True) if data.get('type') == 'bundle')
+    groups = [sorted(component, key=str) for component in nx.connected_components(bundle_graph)]
+    group_of = {node: i for i, component in enumerate(groups) for node in component}
+    
+    contracted = nx.DiGraph()
+    contracted.add_nodes_from(range(len(groups)))
+    internal = set()
+    for u, v, data in graph.edges(data=True):
+        if data.get('type') == 'bundle':
+            continue
+        if group_of[u] == group_of[v]:
+            internal.add(group_of[u])
+        else:
+            contracted.add_edge(group_of[u], group_of[v])
+    
+    cyclic = [component for component in nx.strongly_connected_components(contracted) if len(component) > 1]
+    cyclic += [{group} for group in internal if not any(group in component for component in cyclic)]
+    illegal_cycles = [set().union(*(groups[group] for group in component)) for component in cyclic]
+    
+    topological_order = None
+    if not illegal_cycles:
+        topological_order = [groups[group] for group in nx.topological_sort(contracted)]
+    
+    return {
+        'bundles': [group for group in groups if len(group) > 1],
+        'illegal_cycles': illegal_cycles,
+        'topological_order': topological_order
+    }
+
 def check_graph_validity(graph):
     """
     检查依赖图的有效性，包括检测循环依赖。
     
+    通过强连通分量缩合在线性时间内完成，bundle 捆绑组单独归类，不视为非法循环。
+    
     参数:
     - graph: NetworkX DiGraph对象
     
@@ -132,19 +217,217 @@ def check_graph_validity(graph):
     - valid: 布尔值，表示图是否有效
     - message: 如果无效，提供原因
     """
-    # 检查是否有循环
-    try:
-        cycles = list(nx.simple_cycles(graph))
-        if cycles:
-            return False, f"依赖图中存在循环: {cycles}"
-    except:
-        pass
+    structure = analyze_dependency_structure(graph)
     
-    # 检查其他有效性条件
-    # ...
+    if structure['illegal_cycles']:
+        cycles = [sorted(component, key=str) for component in structure['illegal_cycles']]
+        return False, f"依赖图中存在循环: {cycles}"
+    
+    if structure['bundles']:
+        return True, f"依赖图有效 (包含 {len(structure['bundles'])} 个捆绑组)"
     
     return True, "依赖图有效"
 
+class IncrementalDependencyValidator:
+    """
+    增量依赖图校验器：逐个加入期权时维护捆绑组(并查集)和捆绑组之间的动态拓扑序
+    (Pearce-Kelly算法)，每次只在受影响的拓扑序区间内搜索，非法的边被拒绝并记录。
+    引用尚未加入的期权的依赖会暂存，待该期权加入时再校验。
+    同一对期权上同时声明 bundle 和 disables/triggered_by 时会被判为非法；
+    DiGraph 中后加入的边会覆盖前者，因此 check_graph_validity 看不到这种冲突。
+    """
+    
+    def __init__(self):
+        self.parent = {}          # 并查集：期权 -> 父节点
+        self.order = {}           # 捆绑组代表 -> 拓扑序位置
+        self.successors = {}      # 捆绑组代表 -> 后继组集合
+        self.predecessors = {}    # 捆绑组代表 -> 前驱组集合
+        self.pending = defaultdict(list)  # 缺失的期权 -> 等待校验的边
+        self.violations = []      # 被拒绝的边 (起点, 终点, 类型)
+        self._next_position = 0
+    
+    def _find(self, node):
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+    
+    def _search(self, start, neighbors, keep, target=None):
+        """沿 neighbors 深度优先搜索满足 keep 的组，遇到 target 时返回None表示成环"""
+        visited = {start}
+        stack = [start]
+        while stack:
+            group = stack.pop()
+            for neighbor in neighbors[group]:
+                if neighbor == target:
+                    return None
+                if neighbor not in visited and keep(neighbor):
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+        return visited
+    
+    def _reorder(self, first, second):
+        """把 first 中的组整体排在 second 之前，复用两者原有的拓扑序位置"""
+        groups = sorted(first, key=self.order.get) + sorted(second, key=self.order.get)
+        positions = sorted(self.order[group] for group in groups)
+        for group, position in zip(groups, positions):
+            self.order[group] = position
+    
+    def add_option(self, option):
+        """
+        加入一个期权及其依赖并校验
+        
+        参数:
+        - option: 期权数据
+        
+        返回:
+        - valid: 本次加入的所有边是否合法
+        - message: 说明
+        """
+        option_id = option['id']
+        if option_id not in self.parent:
+            self.parent[option_id] = option_id
+            self.order[option_id] = self._next_position
+            self._next_position += 1
+            self.successors[option_id] = set()
+            self.predecessors[option_id] = set()
+        
+        edges = self.pending.pop(option_id, []) + _option_edges(option)
+        rejected = [edge for edge in edges if not self.add_edge(*edge)]
+        
+        if rejected:
+            return False, f"加入 {option_id} 时拒绝了形成循环的依赖: {rejected}"
+        return True, "依赖图有效"
+    
+    def add_edge(self, source, target, edge_type):
+        """
+        加入一条依赖边；若会形成非法循环则拒绝
+        
+        返回:
+        - accepted: 边是否被接受(端点尚未加入时暂存并返回True)
+        """
+        for endpoint in (source, target):
+            if endpoint not in self.parent:
+                self.pending[endpoint].append((source, target, edge_type))
+                return True
+        
+        u, v = self._find(source), self._find(target)
+        
+        if edge_type == 'bundle':
+            accepted = u == v or self._merge(u, v)
+        elif u == v:
+            accepted = False
+        else:
+            accepted = self._add_group_edge(u, v)
+        
+        if not accepted:
+            self.violations.append((source, target, edge_type))
+        return accepted
+    
+    def _add_group_edge(self, u, v):
+        """捆绑组之间加入有向边 u -> v (Pearce-Kelly)"""
+        if v in self.successors[u]:
+            return True
+        lower, upper = self.order[v], self.order[u]
+        if lower < upper:
+            forward = self._search(v, self.successors, lambda g: self.order[g] < upper, target=u)
+            if forward is None:
+                return False
+            backward = self._search(u, self.predecessors, lambda g: self.order[g] > lower)
+            self._reorder(backward, forward)
+        self.successors[u].add(v)
+        self.predecessors[v].add(u)
+        return True
+    
+    def _merge(self, u, v):
+        """bundle 合并两个捆绑组：两者之间存在有向路径时会形成非法循环"""
+        if self.order[u] > self.order[v]:
+            u, v = v, u
+        upper = self.order[v]
+        forward = self._search(u, self.successors, lambda g: self.order[g] < upper, target=v)
+        if forward is None:
+            return False
+        backward = self._search(v, self.predecessors, lambda g: self.order[g] > self.order[u])
+        
+        # v 的前驱区间排到 u 的后继区间之前，此时 v 与 u 相邻，合并后的组占用 v 的位置
+        self._reorder(backward, forward)
+        position = self.order[v]
+        
+        self.parent[u] = v
+        for successor in self.successors.pop(u):
+            self.predecessors[successor].discard(u)
+            self.predecessors[successor].add(v)
+            self.successors[v].add(successor)
+        for predecessor in self.predecessors.pop(u):
+            self.successors[predecessor].discard(u)
+            self.successors[predecessor].add(v)
+            self.predecessors[v].add(predecessor)
+        del self.order[u]
+        self.order[v] = position
+        return True
+    
+    def is_valid(self):
+        """到目前为止加入的所有依赖是否都合法"""
+        return not self.violations
+
+# 编译后期权表使用的整数编码
+STYLE_EUROPEAN, STYLE_AMERICAN = 0, 1
+TYPE_CALL, TYPE_PUT = 0, 1
+EDGE_TYPES = ('triggered_by', 'disables', 'bundle')
+
+def _build_csr(n_nodes, sources, targets):
+    """由边列表构建CSR邻接数组 (indptr, indices)"""
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+    return indptr, targets[order]
+
+def compile_options(options, graph, n_assets):
+    """
+    将期权列表和依赖图编译为整数索引的NumPy数组，搜索核心不再需要字典、字符串或NetworkX操作。
+    
+    参数:
+    - options: 期权列表
+    - graph: 依赖关系图
+    - n_assets: 资产数量(标的名称为 Asset1..AssetN，找不到时与回溯法一致取0)
+    
+    返回:
+    - compiled: 字典，包含 ids、style、type、strike、quantity、expiry、asset 数组，
+      以及 edges[边类型] = (indptr, indices) 形式的CSR邻接表
+    """
+    ids = [option['id'] for option in options]
+    option_index = {option_id: j for j, option_id in enumerate(ids)}
+    asset_index = {f"Asset{i+1}": i for i in range(n_assets)}
+    
+    compiled = {
+        'ids': ids,
+        'style': np.array([STYLE_EUROPEAN if option['style'] == 'european' else STYLE_AMERICAN
+                           for option in options], dtype=np.int8),
+        'type': np.array([TYPE_CALL if option['type'] == 'call' else TYPE_PUT
+                          for option in options], dtype=np.int8),
+        'strike': np.array([option['K'] for option in options], dtype=float),
+        'quantity': np.array([option['quantity'] for option in options], dtype=float),
+        'expiry': np.array([option['T'] for option in options], dtype=float),
+        'asset': np.array([asset_index.get(option['underlying'], 0) for option in options], dtype=np.int64),
+        'edges': {}
+    }
+    
+    # 按边类型拆分的CSR邻接表
+    edge_lists = {edge_type: ([], []) for edge_type in EDGE_TYPES}
+    for u, v, data in graph.edges(data=True):
+        edge_type = data.get('type', '')
+        if edge_type in edge_lists and u in option_index and v in option_index:
+            edge_lists[edge_type][0].append(option_index[u])
+            edge_lists[edge_type][1].append(option_index[v])
+    for edge_type, (sources, targets) in edge_lists.items():
+        compiled['edges'][edge_type] = _build_csr(len(options), sources, targets)
+    
+    return compiled
+
 #########################
 # 3. 行点树搜索器 (Structure Execution Tree)
 #########################
@@ -172,15 +455,16 @@ def calculate_option_payoff(option, asset_price, time_to_expiry):
     
     return payoff
 
-def search_execution_tree(options, graph, asset_prices, dt):
+def search_execution_tree(options, graph, asset_prices, dt, method="dp"):
     """
-    使用回溯法搜索最优执行序列。
+    搜索每条路径的最优执行序列。
     
     参数:
     - options: 期权列表
     - graph: 依赖关系图
     - asset_prices: 资产价格路径
     - dt: 时间步长
+    - method: "dp" 使用动态规划(默认)，"bnb" 使用分支定界，"backtrack" 使用穷举回溯
     
     返回:
     - best_executions: 每条路径的最优执行序列
@@ -189,6 +473,15 @@ def search_execution_tree(options, graph, asset_prices, dt):
     steps = asset_prices.shape[1]
     best_executions = []
     
+    if method in ("dp", "bnb"):
+        solver = solve_path_dp if method == "dp" else solve_path_branch_and_bound
+        compiled = compile_options(options, graph, asset_prices.shape[2])
+        payoffs, exercisable = compute_payoff_tensor(compiled, asset_prices, dt)
+        for path_idx in range(n_paths):
+            best_sequence, best_payoff = solver(compiled, payoffs[path_idx], exercisable)
+            best_executions.append(best_sequence)
+        return best_executions
+    
     for path_idx in range(n_paths):
         # 记录此路径上的最优执行序列
         path_executions = []
@@ -336,6 +629,655 @@ def backtrack(time_step, graph, options, asset_prices, available_options,
     
     return best_sequence, best_payoff
 
+def compute_payoff_tensor(compiled, asset_prices, dt, start_step=0):
+    """
+    一次性计算所有 (路径, 时间步, 期权) 的执行收益以及可执行掩码，各搜索策略直接按索引读取。
+    
+    参数:
+    - compiled: compile_options 生成的期权表
+    - asset_prices: 资产价格路径，形状为(n_paths, steps, n_assets)
+    - dt: 时间步长
+    - start_step: asset_prices 第一个时间点对应的时间步(只计算部分时间段时使用)
+    
+    返回:
+    - payoffs: 形状为(n_paths, steps, n_options)的收益张量
+    - exercisable: 形状为(steps, n_options)的布尔掩码，欧式期权仅在到期日可执行，美式期权任何时间可执行
+    """
+    steps = asset_prices.shape[1]
+    
+    # 与回溯法相同的执行条件：|T - t*dt| < dt
+    time_to_expiry = compiled['expiry'][None, :] - np.arange(start_step, start_step + steps)[:, None] * dt
+    exercisable = (compiled['style'] == STYLE_AMERICAN)[None, :] | (np.abs(time_to_expiry) < dt)
+    
+    underlying = asset_prices[:, :, compiled['asset']]
+    intrinsic = np.where(compiled['type'] == TYPE_CALL,
+                         underlying - compiled['strike'],
+                         compiled['strike'] - underlying)
+    payoffs = np.maximum(0, intrinsic) * compiled['quantity']
+    
+    return payoffs, exercisable
+
+def option_remove_masks(compiled):
+    """
+    每个期权执行后需要移出可用集合的位掩码：自身以及它通过 disables 边禁用的期权
+    
+    参数:
+    - compiled: compile_options 生成的期权表
+    
+    返回:
+    - remove_masks: Python整数位掩码列表(期权数不受64位限制)
+    """
+    indptr, indices = compiled['edges']['disables']
+    remove_masks = []
+    for j in range(len(compiled['ids'])):
+        mask = 1 << j
+        for k in indices[indptr[j]:indptr[j + 1]].tolist():
+            mask |= 1 << k
+        remove_masks.append(mask)
+    return remove_masks
+
+def _step_candidates(payoffs, exercisable):
+    """每个时间步可执行且收益为正的 (期权位置, 收益) 列表"""
+    active = exercisable & (payoffs > 0)
+    return [list(zip(np.flatnonzero(row).tolist(), step_payoffs[row].tolist()))
+            for row, step_payoffs in zip(active, payoffs)]
+
+def solve_path_dp(compiled, payoffs, exercisable):
+    """
+    动态规划求解单条路径的最优执行序列，与 backtrack 的结果一致。
+    
+    回溯法中已执行和被禁用的期权都不能再执行，triggered_by 边不改变可用集合，
+    因此状态只需 (时间步, 仍可执行期权的位掩码)。对固定的期权数量，
+    状态数不超过 步数 × 2^期权数，运行时间关于步数是多项式的。
+    同等收益时按期权列表顺序优先执行，且只有严格更优时才选择不执行。
+    
+    参数:
+    - compiled: compile_options 生成的期权表
+    - payoffs: 当前路径的收益矩阵，形状为(steps, n_options)
+    - exercisable: 可执行掩码，形状为(steps, n_options)
+    
+    返回:
+    - best_sequence: 最优执行序列
+    - best_payoff: 最优总收益
+    """
+    total_steps = payoffs.shape[0]
+    n_options = len(compiled['ids'])
+    remove_masks = option_remove_masks(compiled)
+    
+    candidates = _step_candidates(payoffs, exercisable)
+    
+    # 前向枚举每个时间步可达的状态
+    full_mask = (1 << n_options) - 1
+    reachable = [{full_mask}]
+    for time_step in range(total_steps):
+        next_states = set()
+        for mask in reachable[time_step]:
+            next_states.add(mask)
+            for j, _ in candidates[time_step]:
+                if mask >> j & 1:
+                    next_states.add(mask & ~remove_masks[j])
+        reachable.append(next_states)
+    
+    # 反向递推：value[t][mask] 为从 t 开始的最优剩余收益，policy 记录最优动作(-1 表示不执行)
+    value = [None] * (total_steps + 1)
+    policy = [None] * total_steps
+    value[total_steps] = dict.fromkeys(reachable[total_steps], 0.0)
+    for time_step in range(total_steps - 1, -1, -1):
+        next_value = value[time_step + 1]
+        step_value = {}
+        step_policy = {}
+        for mask in reachable[time_step]:
+            best_action = -1
+            best_value = None
+            for j, payoff in candidates[time_step]:
+                if mask >> j & 1:
+                    candidate_value = payoff + next_value[mask & ~remove_masks[j]]
+                    if best_value is None or candidate_value > best_value:
+                        best_action, best_value = j, candidate_value
+            skip_value = next_value[mask]
+            if best_value is None or skip_value > best_value:
+                best_action, best_value = -1, skip_value
+            step_value[mask] = best_value
+            step_policy[mask] = best_action
+        value[time_step] = step_value
+        policy[time_step] = step_policy
+    
+    # 沿最优策略还原执行序列
+    best_sequence = []
+    best_payoff = 0
+    mask = full_mask
+    for time_step in range(total_steps):
+        j = policy[time_step][mask]
+        if j < 0:
+            continue
+        payoff = dict(candidates[time_step])[j]
+        best_sequence.append({
+            "option_id": compiled['ids'][j],
+            "time_step": time_step,
+            "payoff": payoff
+        })
+        best_payoff += payoff
+        mask &= ~remove_masks[j]
+    
+    return best_sequence, best_payoff
+
+# 分支定界剪枝时的浮点容差，避免上界求和的舍入误差剪掉真正更优的分支
+_BOUND_TOLERANCE = 1e-9
+
+def solve_path_branch_and_bound(compiled, payoffs, exercisable):
+    """
+    分支定界求解单条路径的最优执行序列，与 backtrack 的结果一致。
+    
+    用两个乐观上界剪枝：仍可执行期权从当前时间起的最大收益之和，
+    以及每步至多执行一个期权时剩余各步最大收益之和。当前收益加上界不能超过已知最优解的分支直接剪掉，
+    相同状态以更低的收益再次到达时也不再展开。子节点按 收益+上界 从高到低展开以尽早得到好的下界；
+    收益完全相同时按回溯法的搜索顺序(期权列表顺序优先执行，最后不执行)取最先的序列。
+    
+    参数:
+    - compiled: compile_options 生成的期权表
+    - payoffs: 当前路径的收益矩阵，形状为(steps, n_options)
+    - exercisable: 可执行掩码，形状为(steps, n_options)
+    
+    返回:
+    - best_sequence: 最优执行序列
+    - best_payoff: 最优总收益
+    """
+    total_steps, n_options = payoffs.shape
+    remove_masks = option_remove_masks(compiled)
+    candidates = _step_candidates(payoffs, exercisable)
+    
+    # 各期权从 t 起的最大可执行收益，以及剩余各步最大收益之和(末尾补0行表示终点)
+    active_payoffs = np.where(exercisable & (payoffs > 0), payoffs, 0.0)
+    future_max = np.zeros((total_steps + 1, n_options))
+    future_max[:total_steps] = np.maximum.accumulate(active_payoffs[::-1], axis=0)[::-1]
+    step_bound = np.zeros(total_steps + 1)
+    if n_options > 0:
+        step_bound[:total_steps] = np.cumsum(active_payoffs.max(axis=1)[::-1])[::-1]
+    future_max = future_max.tolist()
+    step_bound = step_bound.tolist()
+    
+    def upper_bound(time_step, mask):
+        row = future_max[time_step]
+        return min(sum(row[j] for j in range(n_options) if mask >> j & 1), step_bound[time_step])
+    
+    # 回溯法搜索顺序下的序列排序键：执行记录 (时间步, 期权位置) 的字典序，末尾补哨兵
+    def order_key(path):
+        return [(time_step, j) for time_step, j, _ in path] + [(total_steps,)]
+    
+    best = {'payoff': 0.0, 'path': []}
+    visited = {}
+    current_path = []
+    
+    def search(time_step, mask, current_payoff):
+        # 跳过没有可执行候选的时间步
+        while time_step < total_steps and not any(mask >> j & 1 for j, _ in candidates[time_step]):
+            time_step += 1
+        if time_step >= total_steps:
+            if current_payoff > best['payoff'] or (
+                    current_payoff == best['payoff'] and order_key(current_path) < order_key(best['path'])):
+                best['payoff'] = current_payoff
+                best['path'] = list(current_path)
+            return
+        
+        # 相同状态已以更高的收益搜索过
+        state = (time_step, mask)
+        if visited.get(state, -1.0) > current_payoff:
+            return
+        visited[state] = current_payoff
+        
+        if current_payoff + upper_bound(time_step, mask) + _BOUND_TOLERANCE <= best['payoff']:
+            return
+        
+        # 子节点：执行各候选期权或不执行(-1)，按乐观值从高到低展开
+        children = [(payoff + upper_bound(time_step + 1, mask & ~remove_masks[j]), j, payoff)
+                    for j, payoff in candidates[time_step] if mask >> j & 1]
+        children.append((upper_bound(time_step + 1, mask), -1, 0.0))
+        children.sort(key=lambda child: -child[0])
+        
+        for _, j, payoff in children:
+            if j < 0:
+                search(time_step + 1, mask, current_payoff)
+            else:
+                current_path.append((time_step, j, payoff))
+                search(time_step + 1, mask & ~remove_masks[j], current_payoff + payoff)
+                current_path.pop()
+    
+    search(0, (1 << n_options) - 1, 0.0)
+    
+    best_sequence = [{
+        "option_id": compiled['ids'][j],
+        "time_step": time_step,
+        "payoff": payoff
+    } for time_step, j, payoff in best['path']]
+    
+    return best_sequence, best['payoff']
+
+# 工作进程中附加的共享数组：键 -> (SharedMemory, ndarray)
+_SHARED_ARRAYS = {}
+
+# 放入共享内存的期权表字段
+_COMPILED_FIELDS = ('style', 'type', 'strike', 'quantity', 'expiry', 'asset')
+
+def _share_array(array, blocks):
+    """把数组复制到新建的共享内存块，返回供工作进程附加的 (名称, 形状, dtype)"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    blocks.append(shm)
+    return shm.name, array.shape, array.dtype.str
+
+def _attach_shared_arrays(spec):
+    """工作进程初始化：附加共享内存中的价格路径和期权表"""
+    for key, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED_ARRAYS[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+def _solve_path_range(task):
+    """
+    工作进程：求解 [start, stop) 范围内路径的最优执行序列
+    
+    返回:
+    - start: 起始路径
+    - columns: 该范围内的列式执行记录和每条路径的总收益
+    """
+    start, stop, dt = task
+    arrays = {key: array for key, (_, array) in _SHARED_ARRAYS.items()}
+    
+    compiled = {field: arrays[field] for field in _COMPILED_FIELDS}
+    compiled['ids'] = list(range(len(compiled['strike'])))
+    compiled['edges'] = {edge_type: (arrays[f'{edge_type}_indptr'], arrays[f'{edge_type}_indices'])
+                         for edge_type in EDGE_TYPES}
+    
+    payoffs, exercisable = compute_payoff_tensor(compiled, arrays['asset_prices'][start:stop], dt)
+    
+    path, option, time_step, payoff = [], [], [], []
+    total_payoff = np.zeros(stop - start)
+    for offset in range(stop - start):
+        sequence, total_payoff[offset] = solve_path_dp(compiled, payoffs[offset], exercisable)
+        for execution in sequence:
+            path.append(start + offset)
+            option.append(execution['option_id'])
+            time_step.append(execution['time_step'])
+            payoff.append(execution['payoff'])
+    
+    return start, {
+        'path': np.array(path, dtype=np.int64),
+        'option': np.array(option, dtype=np.int64),
+        'time_step': np.array(time_step, dtype=np.int64),
+        'payoff': np.array(payoff, dtype=float),
+        'total_payoff': total_payoff
+    }
+
+def search_execution_tree_parallel(options, graph, asset_prices, dt, n_workers=None, chunk_size=None):
+    """
+    多进程并行搜索各路径的最优执行序列。价格路径和编译后的期权表放入共享内存，
+    工作进程按路径区间求解，结果以列式数组返回。
+    
+    参数:
+    - options: 期权列表
+    - graph: 依赖关系图
+    - asset_prices: 资产价格路径，形状为(n_paths, steps, n_assets)
+    - dt: 时间步长
+    - n_workers: 工作进程数，默认为CPU核数
+    - chunk_size: 每个任务包含的路径数，默认每个进程约4个任务
+    
+    返回:
+    - columns: 字典，包含 option_ids、每条路径的 total_payoff，
+      以及按路径排序的执行记录列 path、option(期权位置)、time_step、payoff
+    """
+    n_paths = asset_prices.shape[0]
+    compiled = compile_options(options, graph, asset_prices.shape[2])
+    
+    n_workers = n_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-n_paths // (n_workers * 4)))
+    tasks = [(start, min(start + chunk_size, n_paths), dt) for start in range(0, n_paths, chunk_size)]
+    
+    blocks = []
+    try:
+        spec = {'asset_prices': _share_array(np.ascontiguousarray(asset_prices, dtype=float), blocks)}
+        for field in _COMPILED_FIELDS:
+            spec[field] = _share_array(compiled[field], blocks)
+        for edge_type, (indptr, indices) in compiled['edges'].items():
+            spec[f'{edge_type}_indptr'] = _share_array(indptr, blocks)
+            spec[f'{edge_type}_indices'] = _share_array(indices, blocks)
+        
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach_shared_arrays,
+                                 initargs=(spec,)) as executor:
+            chunks = [columns for _, columns in executor.map(_solve_path_range, tasks)]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    
+    columns = {key: np.concatenate([chunk[key] for chunk in chunks]) if chunks else np.array([])
+               for key in ('path', 'option', 'time_step', 'payoff', 'total_payoff')}
+    columns['option_ids'] = compiled['ids']
+    return columns
+
+def executions_from_columns(columns):
+    """将列式执行结果转换回 search_execution_tree 的序列格式，便于 aggregate_results 使用"""
+    executions = [[] for _ in range(len(columns['total_payoff']))]
+    for path, option, time_step, payoff in zip(columns['path'].tolist(), columns['option'].tolist(),
+                                               columns['time_step'].tolist(), columns['payoff'].tolist()):
+        executions[path].append({
+            "option_id": columns['option_ids'][option],
+            "time_step": time_step,
+            "payoff": payoff
+        })
+    return executions
+
+def _dense_adjacency(compiled, edge_type):
+    """由CSR邻接表生成 (n_options, n_options) 布尔邻接矩阵"""
+    n_options = len(compiled['ids'])
+    indptr, indices = compiled['edges'][edge_type]
+    adjacency = np.zeros((n_options, n_options), dtype=bool)
+    adjacency[np.repeat(np.arange(n_options), np.diff(indptr)), indices] = True
+    return adjacency
+
+def _lsm_basis(compiled, step_prices, degree):
+    """各期权标的价格(按行权价归一化)的多项式基函数，形状为(n_paths, n_options, degree+1)"""
+    moneyness = step_prices[:, compiled['asset']] / compiled['strike']
+    return moneyness[:, :, None] ** np.arange(degree + 1)
+
+def _lsm_regression(basis, targets, weights):
+    """对每个期权分别做加权最小二乘，返回形状为(n_options, degree+1)的回归系数"""
+    gram = np.einsum('po,pob,poc->obc', weights, basis, basis)
+    moment = np.einsum('po,pob,po->ob', weights, basis, targets)
+    # 轻微岭正则，实值路径过少时系数退化为0
+    ridge = 1e-10 * (np.trace(gram, axis1=1, axis2=2)[:, None, None] + 1.0) * np.eye(basis.shape[2])
+    return np.linalg.solve(gram + ridge, moment[:, :, None])[:, :, 0]
+
+def _lsm_step_policy(exercise_values, continuation, hold, available, triggered, disables):
+    """
+    LSM的单步执行规则，反向拟合和正向定价共用。
+    
+    执行某期权的优势 = 执行收益 - 自身继续持有价值 - 因此被禁用期权的当前价值，
+    每步最多执行一个期权，取优势最大且为正者执行。
+    
+    参数:
+    - exercise_values: 当前时间步的执行收益，形状为(n_paths, n_options)
+    - continuation: 实值路径上回归的继续持有价值(执行边界)
+    - hold: 全部路径上回归的继续持有价值
+    - available: 尚未执行且未被禁用的期权
+    - triggered: 满足 triggered_by 要求的期权
+    - disables: disables 邻接矩阵，disables[j, k] 表示执行 j 会禁用 k
+    
+    返回:
+    - rows: 本步执行的路径
+    - chosen: 这些路径上执行的期权位置
+    """
+    can_exercise = available & triggered & (exercise_values > 0)
+    
+    # 执行j会禁用的期权当前的价值：可执行时取 max(执行收益, 持有价值)
+    alive_values = np.where(available, np.maximum(np.where(can_exercise, exercise_values, 0.0), hold), 0.0)
+    lost_values = alive_values @ disables.T
+    
+    advantage = np.where(can_exercise, exercise_values - continuation - lost_values, -np.inf)
+    choice = np.argmax(advantage, axis=1)
+    best_advantage = advantage[np.arange(len(choice)), choice]
+    
+    rows = np.flatnonzero(best_advantage > 0)
+    return rows, choice[rows]
+
+def price_execution_tree_lsm(options, graph, asset_prices, dt, degree=2, enforce_triggers=True, fit_prices=None):
+    """
+    最小二乘蒙特卡洛(Longstaff-Schwartz)定价：用可实现的执行策略代替逐路径的完美预知最优解。
+    
+    反向过程在回归路径上对每个期权在每个时间步用标的价格的多项式回归估计继续持有价值，
+    所有路径和期权一次向量化完成；每步按与正向过程相同的规则(_lsm_step_policy)决定执行，
+    执行某期权时其自身现金流替换为执行收益，被它禁用的期权失去此后的现金流，
+    因此继续持有价值已计入 disables 边和每步一次执行的限制(本步被挤掉的期权只保留此后的现金流)。
+    正向过程在独立的定价路径上按回归策略执行：每步最多执行一个期权，已执行或被 disables 边禁用的期权不再执行，
+    有 triggered_by 来源的期权只有在某个来源执行后才能执行。
+    
+    反向过程本身不知道路径此前的执行历史。triggered_by 状态的处理方式是：先按所有期权均已触发拟合一次，
+    再在回归路径上正向执行该策略，记录每条路径每步的触发状态，据此重新拟合：
+    未触发的期权在该步不能执行，执行边界只在已触发的路径上回归，其现金流只包含来源执行之后的执行。
+    可用状态(已执行或被禁用)仍按全部可用处理，这是有意的近似。
+    enforce_triggers=False 时与回溯法一致，triggered_by 边不限制可用性。与其他搜索方法一致，收益不折现。
+    
+    参数:
+    - options: 期权列表
+    - graph: 依赖关系图
+    - asset_prices: 定价路径，形状为(n_paths, steps, n_assets)
+    - dt: 时间步长
+    - degree: 回归基函数的多项式阶数
+    - enforce_triggers: 是否要求 triggered_by 来源先执行
+    - fit_prices: 回归路径，形状为(n_fit_paths, steps, n_assets)，应与定价路径独立生成；
+      为 None 时 asset_prices 前一半路径用于回归，后一半用于定价
+    
+    返回:
+    - results: 字典，包含 price、std_error、每条定价路径的 total_payoffs、
+      exercise_step(每条定价路径每个期权的执行时间步，-1表示未执行)、exercise_prob、option_ids，
+      以及继续持有价值的回归系数 coef_hold(形状为(steps, n_options, degree+1))和 degree
+    """
+    if fit_prices is None:
+        split = asset_prices.shape[0] // 2
+        fit_prices, asset_prices = asset_prices[:split], asset_prices[split:]
+    
+    steps = asset_prices.shape[1]
+    compiled = compile_options(options, graph, asset_prices.shape[2])
+    n_options = len(compiled['ids'])
+    disables = _dense_adjacency(compiled, 'disables')
+    triggers = _dense_adjacency(compiled, 'triggered_by')
+    
+    def step_exercise_values(prices, time_step):
+        step_payoffs, step_exercisable = compute_payoff_tensor(
+            compiled, prices[:, time_step:time_step + 1], dt, start_step=time_step)
+        return step_payoffs[:, 0] * step_exercisable[0]
+    
+    def fit_policy(triggered_history):
+        """反向过程：估计执行边界(continuation)和继续持有价值(hold)，triggered_history 为 None 时视为全部已触发"""
+        n_fit_paths = fit_prices.shape[0]
+        coef_continuation = np.zeros((steps, n_options, degree + 1))
+        coef_hold = np.zeros((steps, n_options, degree + 1))
+        future_cashflows = np.zeros((n_fit_paths, n_options))
+        all_paths = np.ones((n_fit_paths, n_options))
+        all_available = np.ones((n_fit_paths, n_options), dtype=bool)
+        
+        for time_step in range(steps - 1, -1, -1):
+            exercise_values = step_exercise_values(fit_prices, time_step)
+            basis = _lsm_basis(compiled, fit_prices[:, time_step], degree)
+            in_the_money = exercise_values > 0
+            
+            triggered = all_available if triggered_history is None else triggered_history[:, time_step]
+            
+            # 执行边界只在可执行(实值且已触发)的路径上回归，未触发路径的现金流只进入持有价值
+            coef_hold[time_step] = _lsm_regression(basis, future_cashflows, all_paths)
+            coef_continuation[time_step] = _lsm_regression(basis, future_cashflows,
+                                                           (in_the_money & triggered).astype(float))
+            
+            continuation = np.einsum('pob,ob->po', basis, coef_continuation[time_step])
+            hold = np.einsum('pob,ob->po', basis, coef_hold[time_step])
+            rows, chosen = _lsm_step_policy(exercise_values, continuation, hold, all_available, triggered, disables)
+            
+            # 被执行期权禁用的期权失去此后的现金流，执行期权的现金流替换为当前执行收益
+            future_cashflows[rows] *= ~disables[chosen]
+            future_cashflows[rows, chosen] = exercise_values[rows, chosen]
+        
+        return coef_continuation, coef_hold
+    
+    def run_policy(prices, coef_continuation, coef_hold, record_triggered=False):
+        """正向过程：按回归策略在依赖约束下执行，可选记录每步开始时的触发状态"""
+        n_paths = prices.shape[0]
+        available = np.ones((n_paths, n_options), dtype=bool)
+        if enforce_triggers:
+            triggered = np.broadcast_to(~triggers.any(axis=0), (n_paths, n_options)).copy()
+        else:
+            triggered = np.ones((n_paths, n_options), dtype=bool)
+        total_payoffs = np.zeros(n_paths)
+        exercise_step = np.full((n_paths, n_options), -1, dtype=np.int64)
+        triggered_history = np.empty((n_paths, steps, n_options), dtype=bool) if record_triggered else None
+        
+        for time_step in range(steps):
+            if record_triggered:
+                triggered_history[:, time_step] = triggered
+            exercise_values = step_exercise_values(prices, time_step)
+            basis = _lsm_basis(compiled, prices[:, time_step], degree)
+            continuation = np.einsum('pob,ob->po', basis, coef_continuation[time_step])
+            hold = np.einsum('pob,ob->po', basis, coef_hold[time_step])
+            rows, chosen = _lsm_step_policy(exercise_values, continuation, hold, available, triggered, disables)
+            
+            total_payoffs[rows] += exercise_values[rows, chosen]
+            exercise_step[rows, chosen] = time_step
+            available[rows, chosen] = False
+            available[rows] &= ~disables[chosen]
+            triggered[rows] |= triggers[chosen]
+        
+        return total_payoffs, exercise_step, triggered_history
+    
+    coef_continuation, coef_hold = fit_policy(None)
+    if enforce_triggers and triggers.any():
+        # 在回归路径上执行初始策略得到逐路径的触发状态，再据此重新拟合
+        _, _, triggered_history = run_policy(fit_prices, coef_continuation, coef_hold, record_triggered=True)
+        coef_continuation, coef_hold = fit_policy(triggered_history)
+    
+    total_payoffs, exercise_step, _ = run_policy(asset_prices, coef_continuation, coef_hold)
+    n_paths = len(total_payoffs)
+    
+    return {
+        'price': total_payoffs.mean(),
+        'std_error': total_payoffs.std(ddof=1) / np.sqrt(n_paths) if n_paths > 1 else 0.0,
+        'total_payoffs': total_payoffs,
+        'exercise_step': exercise_step,
+        'exercise_prob': (exercise_step >= 0).mean(axis=0),
+        'option_ids': compiled['ids'],
+        'coef_hold': coef_hold,
+        'degree': degree
+    }
+
+class OnlineExecutionPlanner:
+    """
+    在线执行规划器：价格bar逐根到达时增量地重新优化执行计划。
+    
+    维护前向DP表：每层记录到当前时间步为止、以某个可用期权位掩码结束的最大已实现收益及回溯指针。
+    新bar到达时只由上一层生成新的一层，已有各层不再重算；可用集合越大未来选择越多，
+    因此被"可用集合更大且收益不低"的状态支配的状态直接剪掉。
+    不提供未来价值估计时，计划即已揭示价格上的全局最优执行序列(与 solve_path_dp 在同一段价格上的结果相同)；
+    提供 price_execution_tree_lsm 的结果时，各状态再加上仍可用期权的LSM继续持有价值来选择计划。
+    每根bar之后可调用 commit 记录实际动作，之后的计划从真实状态出发。
+    """
+    
+    def __init__(self, compiled, dt, lsm=None):
+        """
+        参数:
+        - compiled: compile_options 生成的期权表
+        - dt: 时间步长
+        - lsm: 可选，price_execution_tree_lsm 的结果，用于估计未来价值
+        """
+        self.compiled = compiled
+        self.dt = dt
+        self.lsm = lsm
+        self.remove_masks = option_remove_masks(compiled)
+        self.n_options = len(compiled['ids'])
+        self.time_step = 0
+        self.last_candidates = []
+        self.future_values = np.zeros(self.n_options)
+        # 每层: 位掩码 -> (累计收益, 上一层位掩码, 动作期权位置，-1表示不执行)
+        self.layers = [{(1 << self.n_options) - 1: (0.0, None, -1)}]
+    
+    def _score(self, mask, value):
+        """计划得分：已实现收益加上仍可用期权的未来价值估计"""
+        return value + sum(self.future_values[j] for j in range(self.n_options) if mask >> j & 1)
+    
+    def update(self, step_prices):
+        """
+        加入一根新的价格bar并重新优化
+        
+        参数:
+        - step_prices: 当前时间步各资产的价格，形状为(n_assets,)
+        
+        返回:
+        - decision: 字典，包含 time_step、action(当前应执行的期权ID，None表示不执行)、
+          payoff(该动作的收益)、plan_payoff(计划的已实现总收益) 和 n_states(当前层状态数)
+        """
+        step_prices = np.asarray(step_prices, dtype=float)
+        payoffs, exercisable = compute_payoff_tensor(self.compiled, step_prices[None, None, :],
+                                                     self.dt, start_step=self.time_step)
+        candidates = _step_candidates(payoffs[0], exercisable)[0]
+        
+        if self.lsm is not None and self.time_step < len(self.lsm['coef_hold']):
+            basis = _lsm_basis(self.compiled, step_prices[None, :], self.lsm['degree'])[0]
+            self.future_values = np.maximum((basis * self.lsm['coef_hold'][self.time_step]).sum(axis=1), 0.0)
+        else:
+            self.future_values = np.zeros(self.n_options)
+        
+        # 只由上一层扩展出新的一层
+        layer = {}
+        for mask, (value, _, _) in self.layers[-1].items():
+            transitions = [(mask, value, -1)]
+            transitions += [(mask & ~self.remove_masks[j], value + payoff, j)
+                            for j, payoff in candidates if mask >> j & 1]
+            for next_mask, next_value, action in transitions:
+                if next_mask not in layer or next_value > layer[next_mask][0]:
+                    layer[next_mask] = (next_value, mask, action)
+        
+        kept = self._prune_dominated(layer)
+        self.layers.append(kept)
+        self.last_candidates = candidates
+        self.time_step += 1
+        
+        plan = self.best_plan()
+        action = plan[-1] if plan and plan[-1]['time_step'] == self.time_step - 1 else None
+        return {
+            'time_step': self.time_step - 1,
+            'action': action['option_id'] if action else None,
+            'payoff': action['payoff'] if action else 0.0,
+            'plan_payoff': sum(execution['payoff'] for execution in plan),
+            'n_states': len(kept)
+        }
+    
+    def _prune_dominated(self, layer):
+        """支配剪枝：按收益从高到低，去掉被更早状态(可用集合为超集且收益不低)支配的状态"""
+        items = sorted(layer.items(), key=lambda item: -item[1][0])
+        
+        if self.n_options <= 64 and len(items) > 1:
+            masks = np.array([mask for mask, _ in items], dtype=np.uint64)
+            covers = (masks[:, None] & masks[None, :]) == masks[None, :]
+            dominated = np.triu(covers, k=1).any(axis=0)
+            return {mask: entry for (mask, entry), drop in zip(items, dominated.tolist()) if not drop}
+        
+        kept = {}
+        for mask, entry in items:
+            if not any(other & mask == mask for other in kept):
+                kept[mask] = entry
+        return kept
+    
+    def best_plan(self):
+        """沿回溯指针还原当前最优计划(自上次 commit 以来的执行序列)"""
+        layer = self.layers[-1]
+        mask = max(layer, key=lambda m: self._score(m, layer[m][0]))
+        plan = []
+        first_step = self.time_step - (len(self.layers) - 1)
+        for depth in range(len(self.layers) - 1, 0, -1):
+            value, previous_mask, action = self.layers[depth][mask]
+            if action >= 0:
+                plan.append({
+                    "option_id": self.compiled['ids'][action],
+                    "time_step": first_step + depth - 1,
+                    "payoff": value - self.layers[depth - 1][previous_mask][0]
+                })
+            mask = previous_mask
+        return plan[::-1]
+    
+    def commit(self, option_id=None):
+        """
+        记录最近一根bar上的实际动作，此后的计划从真实状态出发。
+        上次 commit 之后未记录的bar视为没有执行任何期权。
+        
+        参数:
+        - option_id: 实际执行的期权ID，None表示未执行
+        """
+        (mask, (value, _, _)), = self.layers[0].items()
+        
+        if option_id is not None:
+            j = self.compiled['ids'].index(option_id)
+            payoff = dict(self.last_candidates).get(j)
+            if payoff is None or not mask >> j & 1:
+                raise ValueError(f"{option_id} 当前不可执行")
+            mask, value = mask & ~self.remove_masks[j], value + payoff
+        
+        self.layers = [{mask: (value, None, -1)}]
+
 #########################
 # 4. 结果输出 (Result Aggregation)
 #########################
@@ -656,11 +1598,12 @@ def main():
     """
     主函数：运行整个模拟和优化过程。
     """
-    # 参数设置 - 使用极小的数据集，仅用于作品集展示
-    n_assets = 5   # 从10减少到5
+    # 参数设置 - 动态规划搜索不再需要为回溯法缩减规模
+    n_assets = 5
     dt = 1/252     # 日度时间步长
-    steps = 15     # 从30减少到15
-    n_paths = 5    # 从10减少到5
+    steps = 30
+    n_paths = 10
+    n_paths_lsm = 100000  # LSM可实现策略定价使用的路径数
     
     print("生成资产和期权数据...")
     assets, options = generate_assets_and_options(n_assets)
@@ -683,6 +1626,22 @@ def main():
         print("\n汇总结果...")
         results = aggregate_results(executions, asset_prices, options)
         
+        print("\n最小二乘蒙特卡洛(LSM)定价...")
+        # 回归路径与定价路径独立生成，价格为样本外估计
+        lsm_fit_paths = simulate_correlated_paths(assets, dt, steps, n_paths_lsm)
+        lsm_paths = simulate_correlated_paths(assets, dt, steps, n_paths_lsm)
+        lsm = price_execution_tree_lsm(options, graph, lsm_paths, dt, fit_prices=lsm_fit_paths)
+        print(f"LSM价格 ({n_paths_lsm} 条路径): {lsm['price']:.2f} ± {lsm['std_error']:.2f}")
+        
+        print("\n在线执行规划(逐根bar重新优化)...")
+        planner = OnlineExecutionPlanner(compile_options(options, graph, n_assets), dt, lsm=lsm)
+        online_payoff = 0
+        for time_step in range(steps):
+            decision = planner.update(asset_prices[0, time_step])
+            planner.commit(decision['action'])
+            online_payoff += decision['payoff']
+        print(f"路径1在线执行收益: {online_payoff:.2f} (完美预知: {results['total_payoffs'][0]:.2f})")
+        
         print("\n生成可视化...")
         visualize_dependency_graph(graph)
         visualize_payoff_distribution(results)
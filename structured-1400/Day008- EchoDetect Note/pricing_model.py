@@ -4,6 +4,7 @@ import os
 import multiprocessing as mp
 from concurrent.futures import ProcessPoolExecutor
 import sys
+from scipy.special import ndtr
 
 # 检查依赖库
 try:
@@ -20,8 +21,132 @@ print("初始化 EchoDetect Note 定价模型...")
 output_dir = "simulation_charts"
 os.makedirs(output_dir, exist_ok=True)
 
+# 三因子阈值判定
+def compute_trigger_indicators(factors, thresholds=1.5):
+    """
+    逐日判断各因子是否同时超过阈值
+    
+    参数:
+    - factors: 因子数组，最后一维为因子（var / skew / volume），形如 (..., days, n_factors)
+    - thresholds: 阈值，标量或长度为 n_factors 的数组（逐因子阈值）
+    
+    返回:
+    - indicators: 布尔数组，形如 (..., days)
+    """
+    return np.all(factors > np.asarray(thresholds), axis=-1)
+
+# 连续触发检测
+def find_first_run(indicators, run_length=3):
+    """
+    在布尔指示矩阵上查找第一段连续 run_length 天为真的位置
+    
+    用移位视图按位与求"从第 i 天起连续 run_length 天为真"，窗口长度按倍增方式拼接，
+    只需 O(log run_length) 次数组运算；再用 any / argmax 取第一个命中位置。
+    
+    参数:
+    - indicators: 布尔数组，最后一维为天，形如 (..., days)
+    - run_length: 连续天数 L
+    
+    返回:
+    - is_triggered: 是否触发，形如 (...)
+    - trigger_day: 连续段起始日，未触发为 -1，形如 (...)
+    """
+    if run_length < 1:
+        raise ValueError("run_length 必须为正整数")
+    
+    windows = np.asarray(indicators, dtype=bool)
+    length = 1
+    # 倍增：长度为 length 的窗口与其右移 length 的窗口相与，得到长度 2·length 的窗口
+    while length * 2 <= run_length:
+        windows = windows[..., :-length] & windows[..., length:]
+        length *= 2
+    # 余下部分：两个长度为 length 的窗口错开 run_length - length 天即覆盖 run_length 天
+    if length < run_length:
+        shift = run_length - length
+        windows = windows[..., :-shift] & windows[..., shift:]
+    
+    if windows.shape[-1] == 0:
+        is_triggered = np.zeros(windows.shape[:-1], dtype=bool)
+        trigger_day = np.full(windows.shape[:-1], -1)
+    else:
+        is_triggered = windows.any(axis=-1)
+        trigger_day = np.where(is_triggered, windows.argmax(axis=-1), -1)
+    return is_triggered, trigger_day
+
+# VAR(1) 因子模型默认参数（因子顺序 var / skew / volume）
+# 方差冲击会外溢到偏度和成交量，三者新息同期相关
+VAR_COEFFICIENTS = np.array([
+    [0.90, 0.00, 0.00],
+    [0.05, 0.80, 0.00],
+    [0.10, 0.00, 0.85]
+])
+VAR_INNOVATION_COV = np.array([
+    [1.0, 0.3, 0.5],
+    [0.3, 1.0, 0.2],
+    [0.5, 0.2, 1.0]
+])
+
+# VAR(1) 平稳协方差
+def var_stationary_covariance(coefficient_matrix, innovation_cov):
+    """
+    求解 P = A P Aᵀ + Σ，得到 VAR(1) 的平稳协方差
+    
+    参数:
+    - coefficient_matrix: 系数矩阵 A
+    - innovation_cov: 新息协方差 Σ
+    
+    返回:
+    - stationary_cov: 平稳协方差 P
+    """
+    n = coefficient_matrix.shape[0]
+    if np.max(np.abs(np.linalg.eigvals(coefficient_matrix))) >= 1:
+        raise ValueError("VAR(1) 系数矩阵谱半径必须小于 1（过程需平稳）")
+    vec_p = np.linalg.solve(np.eye(n * n) - np.kron(coefficient_matrix, coefficient_matrix), innovation_cov.ravel())
+    stationary_cov = vec_p.reshape(n, n)
+    return (stationary_cov + stationary_cov.T) / 2
+
+# 自相关因子路径生成
+def simulate_var_factors(num_simulations, days=252, coefficient_matrix=None, innovation_cov=None,
+                         standardize=True, dtype=np.float64):
+    """
+    用 VAR(1) 模型批量生成持续且相关的三因子路径
+    
+    x_t = A x_{t-1} + ε_t，ε_t ~ N(0, Σ)，新息通过 Cholesky 分解引入同期相关。
+    初值取自平稳分布，所有路径在 (num_simulations, 3) 状态数组上按时间递推。
+    
+    参数:
+    - num_simulations: 模拟次数
+    - days: 模拟天数
+    - coefficient_matrix: 系数矩阵 A，默认 VAR_COEFFICIENTS
+    - innovation_cov: 新息协方差 Σ，默认 VAR_INNOVATION_COV
+    - standardize: 是否按平稳标准差缩放到单位方差，使阈值仍以 σ 为单位
+    - dtype: 输出精度，np.float32 可减半内存
+    
+    返回:
+    - factors: 因子数组，形如 (num_simulations, days, 3)
+    """
+    A = VAR_COEFFICIENTS if coefficient_matrix is None else np.asarray(coefficient_matrix, dtype=float)
+    sigma = VAR_INNOVATION_COV if innovation_cov is None else np.asarray(innovation_cov, dtype=float)
+    stationary_cov = var_stationary_covariance(A, sigma)
+    
+    # 标准化直接并入系数：y = D⁻¹x 满足 y_t = (D⁻¹ A D) y_{t-1} + D⁻¹ ε_t
+    scale = np.sqrt(np.diag(stationary_cov)) if standardize else np.ones(A.shape[0])
+    A_scaled = (A * scale[None, :] / scale[:, None]).astype(dtype)
+    chol_innov = (np.linalg.cholesky(sigma) / scale[:, None]).astype(dtype)
+    chol_init = (np.linalg.cholesky(stationary_cov) / scale[:, None]).astype(dtype)
+    
+    # 按时间优先布局递推，每步只处理一块连续的 (num_simulations, 3) 状态
+    factors = np.random.standard_normal((days, num_simulations, A.shape[0])).astype(dtype, copy=False)
+    factors[0] = factors[0] @ chol_init.T
+    for t in range(1, days):
+        state = factors[t] @ chol_innov.T
+        state += factors[t - 1] @ A_scaled.T
+        factors[t] = state
+    
+    return factors.transpose(1, 0, 2)
+
 # 模拟单次 EchoDetect Note 策略
-def simulate_echo_note(days=252, initial_price=100, drift=0.05, volatility=0.2, seed=None):
+def simulate_echo_note(days=252, initial_price=100, drift=0.05, volatility=0.2, seed=None, thresholds=1.5, run_length=3):
     """
     模拟单次 EchoDetect Note 策略
     
@@ -31,6 +156,8 @@ def simulate_echo_note(days=252, initial_price=100, drift=0.05, volatility=0.2,
     - drift: 年化漂移
     - volatility: 年化波动率
     - seed: 随机种子
+    - thresholds: 因子阈值，标量或 (var, skew, volume) 逐因子阈值
+    - run_length: 触发所需连续天数
     
     返回:
     - is_triggered: 是否触发
@@ -46,17 +173,12 @@ def simulate_echo_note(days=252, initial_price=100, drift=0.05, volatility=0.2,
     skew_path = np.random.normal(0, 1, days)
     volume_path = np.random.normal(0, 1, days)
     
-    # 判断是否触发 - 连续 3 天三因子同时超过阈值
-    trigger_indicators = (var_path > 1.5) & (skew_path > 1.5) & (volume_path > 1.5)
-    is_triggered = False
-    trigger_day = -1
-    
-    # 检查是否有连续 3 天触发
-    for i in range(days - 2):
-        if trigger_indicators[i] and trigger_indicators[i+1] and trigger_indicators[i+2]:
-            is_triggered = True
-            trigger_day = i
-            break
+    # 判断是否触发 - 连续 run_length 天三因子同时超过阈值
+    trigger_indicators = compute_trigger_indicators(
+        np.stack([var_path, skew_path, volume_path], axis=-1), thresholds
+    )
+    is_triggered, trigger_day = find_first_run(trigger_indicators, run_length)
+    is_triggered, trigger_day = bool(is_triggered), int(trigger_day)
     
     # 模拟 SPY 价格路径
     daily_returns = np.random.normal(drift / days, volatility / np.sqrt(days), days)
@@ -76,35 +198,90 @@ def calculate_echo_payoff(is_triggered, final_price, initial_price=100):
     - initial_price: 初始价格
     
     返回:
-    - payoff: 收益
+    - payoff: 收益（输入为数组时逐元素计算，返回同形状数组）
     """
-    if is_triggered:
-        if final_price >= initial_price * 1.05:
-            return initial_price * 1.2  # 120% 收益
-        elif final_price <= initial_price * 0.95:
-            return initial_price * 0.8  # 80% 收益
-        else:
-            return initial_price  # 100% 收益
+    is_triggered = np.asarray(is_triggered, dtype=bool)
+    final_price = np.asarray(final_price, dtype=float)
+    
+    # 触发后按最终价格分档，未触发统一 95%；标量和数组输入共用同一套规则
+    payoff = np.select(
+        [
+            is_triggered & (final_price >= initial_price * 1.05),  # 120% 收益
+            is_triggered & (final_price <= initial_price * 0.95),  # 80% 收益
+            is_triggered                                           # 100% 收益
+        ],
+        [initial_price * 1.2, initial_price * 0.8, initial_price],
+        default=initial_price * 0.95  # 95% 收益（未触发）
+    )
+    return payoff[()] if payoff.ndim == 0 else payoff
+
+# 批量模拟 EchoDetect Note 策略
+def simulate_echo_batch(num_simulations, days=252, initial_price=100, drift=0.05, volatility=0.2, seed=None, return_paths=False,
+                        thresholds=1.5, run_length=3, factor_model=None):
+    """
+    一次性模拟一批 EchoDetect Note 路径
+    
+    三因子扰动按 (num_simulations, days, 3) 整块生成，日收益按 (num_simulations, days) 整块生成，
+    触发判定和价格累计全部在数组上完成，不再逐条路径循环。
+    
+    参数:
+    - num_simulations: 本批模拟次数
+    - days: 模拟天数
+    - initial_price: 初始价格
+    - drift: 年化漂移
+    - volatility: 年化波动率
+    - seed: 随机种子
+    - return_paths: 是否返回完整价格路径（会额外占用 num_simulations × days 内存）
+    - thresholds: 因子阈值，标量或 (var, skew, volume) 逐因子阈值
+    - run_length: 触发所需连续天数
+    - factor_model: None 为独立同分布因子；传入 dict 时作为 simulate_var_factors 的参数生成 VAR(1) 因子
+    
+    返回:
+    - dict，包含 is_triggered、trigger_day（未触发为 -1）、final_price，
+      以及 return_paths=True 时的 price_paths
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    
+    # 模拟扰动路径：最后一维依次为 var / skew / volume
+    if factor_model is None:
+        factors = np.random.normal(0, 1, (num_simulations, days, 3))
     else:
-        return initial_price * 0.95  # 95% 收益（未触发）
+        factors = simulate_var_factors(num_simulations, days, **factor_model)
+    
+    # 判断是否触发 - 连续 run_length 天三因子同时超过阈值
+    trigger_indicators = compute_trigger_indicators(factors, thresholds)
+    is_triggered, trigger_day = find_first_run(trigger_indicators, run_length)
+    
+    # 模拟 SPY 价格路径
+    daily_returns = np.random.normal(drift / days, volatility / np.sqrt(days), (num_simulations, days))
+    result = {'is_triggered': is_triggered, 'trigger_day': trigger_day}
+    if return_paths:
+        price_paths = initial_price * np.exp(np.cumsum(daily_returns, axis=1))
+        result['price_paths'] = price_paths
+        result['final_price'] = price_paths[:, -1]
+    else:
+        result['final_price'] = initial_price * np.exp(daily_returns.sum(axis=1))
+    
+    return result
 
-# 单次模拟函数（用于多进程）
-def single_simulation(sim_id, days=252, initial_price=100, drift=0.05, volatility=0.2):
-    is_triggered, final_price, _, _ = simulate_echo_note(
-        days=days, 
-        initial_price=initial_price, 
-        drift=drift, 
-        volatility=volatility,
-        seed=sim_id
-    )
-    payoff = calculate_echo_payoff(is_triggered, final_price, initial_price)
-    return payoff, is_triggered
+# 批量模拟函数（用于多进程，每个任务处理一整块路径）
+def simulate_payoff_chunk(num_simulations, seed, days=252, initial_price=100, drift=0.05, volatility=0.2,
+                          thresholds=1.5, run_length=3, factor_model=None):
+    batch = simulate_echo_batch(num_simulations, days, initial_price, drift, volatility, seed=seed,
+                                thresholds=thresholds, run_length=run_length, factor_model=factor_model)
+    payoffs = calculate_echo_payoff(batch['is_triggered'], batch['final_price'], initial_price)
+    return payoffs, batch['is_triggered']
 
 # Monte Carlo 定价方法
-def monte_carlo_pricing(num_simulations=10000, days=252, initial_price=100, drift=0.05, volatility=0.2, use_multiprocessing=True):
+def monte_carlo_pricing(num_simulations=10000, days=252, initial_price=100, drift=0.05, volatility=0.2, use_multiprocessing=True, batch_size=10000, random_seed=0,
+                        thresholds=1.5, run_length=3, factor_model=None):
     """
     Monte Carlo 定价方法
     
+    模拟按 batch_size 切成少量大块，每块用 SeedSequence 派生的独立种子批量模拟，
+    结果与是否启用多进程无关；只有块数多于一块且机器有多个核心时才启用进程池。
+    
     参数:
     - num_simulations: 模拟次数
     - days: 模拟天数
@@ -112,51 +289,47 @@ def monte_carlo_pricing(num_simulations=10000, days=252, initial_price=100, drif
     - drift: 年化漂移
     - volatility: 年化波动率
     - use_multiprocessing: 是否使用多进程
+    - batch_size: 每块模拟次数，控制单块内存占用（约 batch_size × days × 32 字节，默认约 80 MB）
+    - random_seed: 随机种子
+    - thresholds: 因子阈值，标量或 (var, skew, volume) 逐因子阈值
+    - run_length: 触发所需连续天数
+    - factor_model: 因子模型参数，None 为独立同分布，dict 为 VAR(1)（见 simulate_var_factors）
     
     返回:
     - mean_payoff: 平均收益
     - confidence_interval: 置信区间
-    - payoffs: 收益列表
+    - payoffs: 收益数组
     - triggered_ratio: 触发比例
     """
-    payoffs = []
-    triggers = []
+    chunk_sizes = [min(batch_size, num_simulations - start) for start in range(0, num_simulations, batch_size)]
+    chunk_seeds = [int(child.generate_state(1)[0])
+                   for child in np.random.SeedSequence(random_seed).spawn(len(chunk_sizes))]
     
-    try:
-        if use_multiprocessing and num_simulations > 100:
-            try:
-                # 尝试使用 ProcessPoolExecutor
-                with ProcessPoolExecutor(max_workers=mp.cpu_count()) as executor:
-                    futures = []
-                    for i in range(num_simulations):
-                        futures.append(executor.submit(single_simulation, i, days, initial_price, drift, volatility))
-                    
-                    for future in tqdm(futures, desc="Running Monte Carlo Simulations"):
-                        payoff, is_triggered = future.result()
-                        payoffs.append(payoff)
-                        triggers.append(is_triggered)
-            except Exception as e:
-                print(f"多进程执行失败，切换到单进程: {e}")
-                use_multiprocessing = False
-        
-        if not use_multiprocessing or len(payoffs) == 0:
-            # 单进程运行
-            for i in tqdm(range(num_simulations), desc="Running Monte Carlo Simulations"):
-                payoff, is_triggered = single_simulation(i, days, initial_price, drift, volatility)
-                payoffs.append(payoff)
-                triggers.append(is_triggered)
+    results = None
+    n_workers = min(mp.cpu_count(), len(chunk_sizes))
+    if use_multiprocessing and n_workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [
+                    executor.submit(simulate_payoff_chunk, size, chunk_seed, days, initial_price, drift, volatility,
+                                    thresholds, run_length, factor_model)
+                    for size, chunk_seed in zip(chunk_sizes, chunk_seeds)
+                ]
+                results = [future.result() for future in tqdm(futures, desc="Running Monte Carlo Simulations")]
+        except Exception as e:
+            print(f"多进程执行失败，切换到单进程: {e}")
+            results = None
     
-    except Exception as e:
-        print(f"模拟过程中出错: {e}")
-        # 如果出错，至少返回一些模拟结果
-        if len(payoffs) < 100:
-            print("生成简单模拟数据...")
-            for i in range(1000):
-                is_triggered = np.random.random() > 0.7
-                final_price = initial_price * (1 + np.random.normal(0.05, 0.2))
-                payoff = calculate_echo_payoff(is_triggered, final_price, initial_price)
-                payoffs.append(payoff)
-                triggers.append(is_triggered)
+    if results is None:
+        # 单进程运行
+        results = [
+            simulate_payoff_chunk(size, chunk_seed, days, initial_price, drift, volatility, thresholds, run_length,
+                                  factor_model)
+            for size, chunk_seed in tqdm(list(zip(chunk_sizes, chunk_seeds)), desc="Running Monte Carlo Simulations")
+        ]
+    
+    payoffs = np.concatenate([chunk_payoffs for chunk_payoffs, _ in results])
+    triggers = np.concatenate([chunk_triggers for _, chunk_triggers in results])
     
     # 计算定价和置信区间
     mean_payoff = np.mean(payoffs)
@@ -171,6 +344,131 @@ def monte_carlo_pricing(num_simulations=10000, days=252, initial_price=100, drif
     
     return mean_payoff, confidence_interval, payoffs, triggered_ratio
 
+# 连续触发的精确概率（游程长度马尔可夫链）
+def run_length_trigger_distribution(daily_probability, days=252, run_length=3):
+    """
+    用游程长度马尔可夫链精确计算连续 run_length 天触发的概率
+    
+    状态为当前连续满足条件的天数 0..run_length-1，达到 run_length 即吸收（触发）。
+    每天以 daily_probability 延长游程，否则游程归零。
+    
+    参数:
+    - daily_probability: 单日三因子同时超过阈值的概率
+    - days: 模拟天数
+    - run_length: 触发所需连续天数
+    
+    返回:
+    - trigger_probability: days 天内至少出现一次连续 run_length 天的概率
+    - first_trigger_pmf: 首次触发日（连续段起始日，与模拟中的 trigger_day 一致）的概率分布，长度为 days
+    """
+    if run_length < 1:
+        raise ValueError("run_length 必须为正整数")
+    
+    state = np.zeros(run_length)
+    state[0] = 1.0
+    first_trigger_pmf = np.zeros(days)
+    for day in range(days):
+        # 当天完成游程的概率即首次触发概率，单独累加以保留极小概率的精度
+        completed = daily_probability * state[-1]
+        if day >= run_length - 1:
+            first_trigger_pmf[day - run_length + 1] = completed
+        continued = daily_probability * state[:-1]
+        state[0] = (1 - daily_probability) * state.sum()
+        state[1:] = continued
+    
+    return first_trigger_pmf.sum(), first_trigger_pmf
+
+# 精确定价模式
+def exact_echo_pricing(days=252, initial_price=100, drift=0.05, volatility=0.2, thresholds=1.5, run_length=3):
+    """
+    EchoDetect Note 精确定价
+    
+    三因子为独立标准正态，单日触发概率为各因子超阈概率之积；价格路径与因子独立，
+    期末对数收益服从 N(drift, volatility²)，因此票据价值 = 触发概率 × 触发后条件收益
+    + 未触发概率 × 95%。
+    
+    参数:
+    - days: 模拟天数
+    - initial_price: 初始价格
+    - drift: 年化漂移
+    - volatility: 年化波动率
+    - thresholds: 因子阈值，标量或 (var, skew, volume) 逐因子阈值
+    - run_length: 触发所需连续天数
+    
+    返回:
+    - dict，包含 note_value、payoff_std、trigger_probability、first_trigger_pmf、
+      daily_probability、prob_up、prob_down、triggered_payoff
+    """
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), (3,))
+    daily_probability = float(np.prod(ndtr(-thresholds)))
+    trigger_probability, first_trigger_pmf = run_length_trigger_distribution(daily_probability, days, run_length)
+    
+    # 期末价格分档概率（与 calculate_echo_payoff 的 ±5% 分档一致）
+    prob_up = float(ndtr((drift - np.log(1.05)) / volatility))
+    prob_down = float(ndtr((np.log(0.95) - drift) / volatility))
+    prob_mid = 1 - prob_up - prob_down
+    
+    payoff_levels = np.array([initial_price * 1.2, initial_price * 0.8, initial_price, initial_price * 0.95])
+    payoff_probs = np.array([
+        trigger_probability * prob_up,
+        trigger_probability * prob_down,
+        trigger_probability * prob_mid,
+        1 - trigger_probability
+    ])
+    note_value = payoff_probs @ payoff_levels
+    payoff_std = np.sqrt(max(payoff_probs @ payoff_levels ** 2 - note_value ** 2, 0.0))
+    
+    return {
+        'note_value': note_value,
+        'payoff_std': payoff_std,
+        'trigger_probability': trigger_probability,
+        'first_trigger_pmf': first_trigger_pmf,
+        'daily_probability': daily_probability,
+        'prob_up': prob_up,
+        'prob_down': prob_down,
+        'triggered_payoff': payoff_levels[:3] @ np.array([prob_up, prob_down, prob_mid])
+    }
+
+# 用精确解校验 Monte Carlo 模拟
+def validate_simulator(num_simulations=200000, days=252, initial_price=100, drift=0.05, volatility=0.2,
+                       thresholds=0.5, run_length=3, random_seed=0):
+    """
+    用精确定价校验 Monte Carlo 模拟器
+    
+    默认阈值 1.5 下触发概率极小，模拟几乎看不到触发，因此校验时使用较低阈值，
+    让触发分支被充分抽样。
+    
+    参数:
+    - num_simulations: 模拟次数
+    - days: 模拟天数
+    - initial_price: 初始价格
+    - drift: 年化漂移
+    - volatility: 年化波动率
+    - thresholds: 因子阈值
+    - run_length: 触发所需连续天数
+    - random_seed: 随机种子
+    
+    返回:
+    - dict，包含模拟值与精确值、触发比例，以及对应的 z 值
+    """
+    exact = exact_echo_pricing(days, initial_price, drift, volatility, thresholds, run_length)
+    mean_payoff, _, payoffs, triggered_ratio = monte_carlo_pricing(
+        num_simulations=num_simulations, days=days, initial_price=initial_price, drift=drift,
+        volatility=volatility, random_seed=random_seed, thresholds=thresholds, run_length=run_length
+    )
+    
+    p = exact['trigger_probability']
+    trigger_se = np.sqrt(max(p * (1 - p), 1e-300) / num_simulations)
+    value_se = max(exact['payoff_std'], 1e-300) / np.sqrt(num_simulations)
+    return {
+        'mc_value': mean_payoff,
+        'exact_value': exact['note_value'],
+        'value_z': (mean_payoff - exact['note_value']) / value_se,
+        'mc_trigger_ratio': triggered_ratio,
+        'exact_trigger_probability': p,
+        'trigger_z': (triggered_ratio - p) / trigger_se
+    }
+
 # 组合策略 A：SPY vs SPY+EchoNote
 def simulate_combination_strategy(num_simulations=1000, days=252, initial_price=100, drift=0.05, volatility=0.2):
     """
@@ -444,7 +742,6 @@ if __name__ == "__main__":
     try:
         print("📊 开始 EchoDetect Note 定价模拟...")
         
-        # 减少模拟数量以加快速度，同时避免可能的内存问题
         simulation_count = 5000  # 减少模拟次数
         
         mean_payoff, confidence_interval, payoffs, triggered_ratio = monte_carlo_pricing(
@@ -459,6 +756,28 @@ if __name__ == "__main__":
         print(f"95% 置信区间: [{confidence_interval[0]:.2f}, {confidence_interval[1]:.2f}]")
         print(f"触发比例: {triggered_ratio:.2%}")
         
+        # 精确定价：默认阈值下触发极罕见，模拟结果基本只反映未触发分支
+        exact = exact_echo_pricing(days=252, initial_price=100, drift=0.05, volatility=0.2)
+        print(f"精确定价: {exact['note_value']:.6f}, 精确触发概率: {exact['trigger_probability']:.3e}")
+        
+        # 较低阈值下用精确解校验模拟器
+        check = validate_simulator(num_simulations=simulation_count)
+        print(f"模拟器校验 (阈值 0.5): 模拟 {check['mc_value']:.4f} vs 精确 {check['exact_value']:.4f} "
+              f"(z={check['value_z']:.2f}), 触发比例 {check['mc_trigger_ratio']:.4%} vs "
+              f"{check['exact_trigger_probability']:.4%} (z={check['trigger_z']:.2f})")
+        
+        # 自相关因子：VAR(1) 模型下因子持续且相关，连续触发明显更常见
+        var_payoff, var_interval, _, var_triggered_ratio = monte_carlo_pricing(
+            num_simulations=simulation_count,
+            days=252,
+            initial_price=100,
+            drift=0.05,
+            volatility=0.2,
+            factor_model={'dtype': np.float32}
+        )
+        print(f"VAR(1) 因子平均收益: {var_payoff:.4f} "
+              f"[{var_interval[0]:.4f}, {var_interval[1]:.4f}], 触发比例: {var_triggered_ratio:.4%}")
+        
         # 可视化独立收益分布
         visualize_payoff_distribution(payoffs, triggered_ratio)
         